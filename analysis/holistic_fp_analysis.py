@@ -1,53 +1,162 @@
 import math
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
 
 from model.analysis_function import AnalysisFunction, reset_wcrt, init_wcrt, higher_priority
 from model.linear_system import LinearSystem
+from utils.jit import njit, prange
 
 
 class HolisticFPAnalysis(AnalysisFunction):
-    def __init__(self, limit_factor=10, reset=False, verbose=False):
+    def __init__(self, limit_factor=10, reset=False, verbose=False, unroll=False):
         self.limit_factor = limit_factor
         self.reset = reset
         self.verbose = verbose
+        self.unroll = unroll  # use w kernels specialized for the number of higher priority tasks (see _unrolled)
 
     def reset_wcrts(self, system: LinearSystem):
         if self.reset:
             reset_wcrt(system)
 
+    @staticmethod
+    def _higher_priority_vectors(task):
+        """Higher priority tasks of 'task', with their periods and wcets as vectors"""
+        hp = higher_priority(task)
+        hp_p = np.fromiter((t.period for t in hp), dtype=np.float64, count=len(hp))
+        hp_c = np.fromiter((t.wcet for t in hp), dtype=np.float64, count=len(hp))
+
+        # higher priority tasks released by 'task' have its wcrt as jitter
+        hp_fb = np.fromiter((task in t.predecessors for t in hp), dtype=np.bool_, count=len(hp))
+        return hp, hp_p, hp_c, hp_fb
+
     def apply(self, system: LinearSystem) -> None:
+        if self.verbose or self.unroll:
+            self._apply_tasks(system)
+            return
+
         init_wcrt(system)
+        tasks, wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, wcrts = self._task_vectors(system)
+        updated = np.zeros(len(tasks), dtype=np.bool_)
+        failed = _holistic_fp_kernel(wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, wcrts, updated)
+        self._write_back(system, tasks, wcrts, updated, failed)
+
+    def apply_batch(self, systems: [LinearSystem]) -> None:
+        """
+        Analyzes several systems at once, with the same results as applying the analysis to each one. The task vectors
+        of all the systems are concatenated, and the systems are analyzed in parallel by a single kernel call
+        """
+        if self.verbose or self.unroll:
+            for system in systems:
+                self._apply_tasks(system)
+            return
+
+        for system in systems:
+            init_wcrt(system)
+        vectors = [self._task_vectors(system) for system in systems]
+
+        # task and higher priority indices of each system are shifted by the number of tasks of the previous ones
+        sizes = np.array([len(v[0]) for v in vectors], dtype=np.intp)
+        task_ptr = np.zeros(len(systems) + 1, dtype=np.intp)
+        np.cumsum(sizes, out=task_ptr[1:])
+        hp_sizes = np.array([len(v[6]) for v in vectors], dtype=np.intp)
+        offsets = task_ptr[:-1]
+        hp_offsets = np.cumsum(hp_sizes) - hp_sizes
+
+        wcets = np.concatenate([v[1] for v in vectors])
+        periods = np.concatenate([v[2] for v in vectors])
+        limits = np.concatenate([v[3] for v in vectors])
+        pred = np.concatenate([np.where(v[4] >= 0, v[4] + offset, -1) for v, offset in zip(vectors, offsets)])
+        hp_ptr = np.concatenate([[0]] + [v[5][1:] + hp_offset for v, hp_offset in zip(vectors, hp_offsets)])
+        hp_idx = np.concatenate([v[6] + offset for v, offset in zip(vectors, offsets)])
+        hp_fb = np.concatenate([v[7] for v in vectors])
+        wcrts = np.concatenate([v[8] for v in vectors])
+        updated = np.zeros(len(wcets), dtype=np.bool_)
+        failed = np.empty(len(systems), dtype=np.intp)
+        _holistic_fp_batch(wcets, periods, limits, pred, hp_ptr.astype(np.intp), hp_idx.astype(np.intp), hp_fb,
+                           wcrts, updated, task_ptr, failed)
+
+        for s, (system, v) in enumerate(zip(systems, vectors)):
+            lo, hi = task_ptr[s], task_ptr[s + 1]
+            self._write_back(system, v[0], wcrts[lo:hi], updated[lo:hi], failed[s] - lo if failed[s] >= 0 else -1)
+
+    def _task_vectors(self, system: LinearSystem):
+        """Task vectors of the system, in system.tasks order, as expected by _holistic_fp_kernel"""
+        tasks = system.tasks
+        n = len(tasks)
+
+        # tasks are stored flow by flow: the predecessor of a task is the previous one, and its successors go up to
+        # the end of the flow
+        pred = np.array([i - 1 if task.idx > 0 else -1 for i, task in enumerate(tasks)], dtype=np.intp)
+        wcets = np.fromiter((task.wcet for task in tasks), dtype=np.float64, count=n)
+        periods = np.fromiter((task.period for task in tasks), dtype=np.float64, count=n)
+        limits = np.fromiter((task.flow.deadline * self.limit_factor for task in tasks), dtype=np.float64, count=n)
+        wcrts = np.fromiter((task.wcrt for task in tasks), dtype=np.float64, count=n)
+
+        # higher priority tasks of each task (see higher_priority), in CSR layout: those of task i are
+        # hp_idx[hp_ptr[i]:hp_ptr[i+1]], in system order like the tasks of a processor
+        proc_index = {}
+        mapping = np.fromiter((proc_index.setdefault(task.processor, len(proc_index)) for task in tasks),
+                              dtype=np.intp, count=n)
+        priorities = np.fromiter((task.priority for task in tasks), dtype=np.float64, count=n)
+        hp_mask = (priorities[None, :] >= priorities[:, None]) & (mapping[None, :] == mapping[:, None])
+        np.fill_diagonal(hp_mask, False)
+        rows, hp_idx = np.nonzero(hp_mask)
+        hp_ptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(hp_mask.sum(axis=1), out=hp_ptr[1:])
+        hp_fb = pred[hp_idx] == rows  # higher priority tasks released by the analyzed task
+        return tasks, wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, wcrts
 
-        wcrts = [t.wcrt for t in system.tasks]
-        wcrts_prev = [0 for t in system.tasks]
+    def _write_back(self, system: LinearSystem, tasks, wcrts, updated, failed) -> None:
+        # only the response times that grew are written, the rest keep the values set by init_wcrt
+        values = wcrts.tolist()
+        for i in np.flatnonzero(updated).tolist():
+            tasks[i].wcrt = values[i]
 
-        while wcrts != wcrts_prev:  # LOOP wcrt convergence loop
-            wcrts_prev = wcrts[:]
+        if failed >= 0:
+            task = tasks[failed]
+            if self.reset:
+                self.reset_wcrts(system)
+            else:
+                for t in task.all_successors:
+                    t.wcrt = task.wcrt
+
+    def _apply_tasks(self, system: LinearSystem) -> None:
+        """Task by task version of the analysis, used in verbose mode and with unrolled kernels"""
+        init_wcrt(system)
+
+        # priorities do not change during the analysis
+        hp_map = {task: self._higher_priority_vectors(task) for task in system.tasks}
+
+        changed = True
+        while changed:  # LOOP wcrt convergence loop, wcrts only grow
+            changed = False
 
             for task in system.tasks:  # LOOP task loop
-                hp = higher_priority(task)  # tasks of higher priority than 'task'
+                hp, hp_p, hp_c, hp_fb = hp_map[task]  # tasks of higher priority than 'task'
+                hp_j = np.fromiter((t.jitter for t in hp), dtype=np.float64, count=len(hp))
+                converge_w = _unrolled(len(hp)) if self.unroll else _converge_w
                 limit = task.flow.deadline * self.limit_factor  # r limit for 'task'
 
                 p = 1
                 while True:  # LOOP p loop
-                    w_prev = 0
-                    w = p * task.wcet
-
-                    while w != w_prev:  # LOOP w convergence loop
-                        w_prev = w
-                        w = sum(map(lambda t: math.ceil((t.jitter + w) / t.period) * t.wcet, hp)) + p * task.wcet
-                        r = w - (p - 1) * task.period + task.jitter
-
-                        if self.verbose:
-                            print(f"{task.name} p={p} w={w:.3f} wprev={w_prev:.3f} r={r:.3f} wcrt={task.wcrt:.3f}")
-                        if r > task.wcrt:
-                            task.wcrt = r
-                        if r > limit:
-                            if self.reset:
-                                self.reset_wcrts(system)
-                            else:
-                                for t in task.all_successors:
-                                    t.wcrt = task.wcrt
-                            return
+                    w, wcrt = converge_w(hp_j, hp_p, hp_c, hp_fb, float(task.wcet), float(task.period),
+                                         float(task.jitter), float(task.wcrt), p, float(limit))
+                    r = w - (p - 1) * task.period + task.jitter
+                    if wcrt > task.wcrt:
+                        task.wcrt = wcrt
+                        changed = True
+
+                    if self.verbose:
+                        print(f"{task.name} p={p} w={w:.3f} r={r:.3f} wcrt={task.wcrt:.3f}")
+                    if r > limit:
+                        if self.reset:
+                            self.reset_wcrts(system)
+                        else:
+                            for t in task.all_successors:
+                                t.wcrt = task.wcrt
+                        return
 
                     if w <= p * task.period:
                         break  # no need to try more p's
@@ -56,5 +165,227 @@ class HolisticFPAnalysis(AnalysisFunction):
 
                 # no need to do anything here, just jump to next task
 
-            # retrieve the wcrts to see if they have changed since the last iteration
-            wcrts = [t.wcrt for t in system.tasks]
+
+class MemoizedHolisticFPAnalysis(HolisticFPAnalysis):
+    """
+    HolisticFPAnalysis that memoizes the response times of the last 'maxsize' analyzed assignments (LRU). The analysis
+    only depends on the relative order of the priorities, so assignments that rank the priorities the same way, with
+    the same mapping and wcets, share their results. Periods and deadlines are assumed not to change until the cache
+    is cleared
+    """
+    def __init__(self, limit_factor=10, reset=False, verbose=False, unroll=False, maxsize=8192):
+        super().__init__(limit_factor=limit_factor, reset=reset, verbose=verbose, unroll=unroll)
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = Lock()  # the analysis may be shared by several threads (see SequentialGradientFunction)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _key(system: LinearSystem):
+        tasks = system.tasks
+        procs = system.processors
+        priorities = np.fromiter((t.priority for t in tasks), dtype=np.float64, count=len(tasks))
+        ranks = np.unique(priorities, return_inverse=True)[1]  # equal priorities get equal ranks
+        wcets = np.fromiter((t.wcet for t in tasks), dtype=np.float64, count=len(tasks))
+        return ranks.tobytes(), tuple(procs.index(t.processor) for t in tasks), wcets.tobytes()
+
+    def apply(self, system: LinearSystem) -> None:
+        key = self._key(system)
+        with self._lock:
+            wcrts = self._cache.get(key)
+            if wcrts is not None:
+                self._cache.move_to_end(key)
+        if wcrts is not None:
+            for task, wcrt in zip(system.tasks, wcrts):
+                task.wcrt = wcrt
+            return
+
+        super().apply(system)
+        with self._lock:
+            self._cache[key] = [task.wcrt for task in system.tasks]
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+
+def holistic_fp_scenarios(system: LinearSystem, scenarios: np.ndarray, limit_factor=10) -> np.ndarray:
+    """
+    Response times of the system under each of the given priority scenarios, a (s, t, t) matrix in which
+    scenarios[k, i, j] is nonzero when task j interferes task i in scenario k (see vector.vector_fp.scenarios_matrix).
+    Each scenario is analyzed as HolisticFPAnalysis(reset=False) would, and the scenarios are analyzed in parallel.
+    Returns a (t, s) matrix, with the response times of each scenario in a column
+    """
+    init_wcrt(system)
+    _, wcets, periods, limits, pred, _, _, _, wcrts = HolisticFPAnalysis(limit_factor=limit_factor)._task_vectors(system)
+    scenarios = np.ascontiguousarray(scenarios, dtype=np.bool_)
+    out = np.empty((len(wcets), scenarios.shape[0]))
+    _holistic_fp_scenarios(wcets, periods, limits, pred, wcrts, scenarios, out)
+    return out
+
+
+# the FP kernels are compiled (or loaded from the cache) eagerly at import: the evaluation pools fork their workers
+# after importing this module, so the workers do not compile them again
+@njit("UniTuple(float64, 2)(float64[::1], float64[::1], float64[::1], bool_[::1], float64, float64, float64, float64, "
+      "intp, float64)", cache=True, nogil=True)
+def _converge_w(hp_j, hp_p, hp_c, hp_fb, wcet, period, jitter, wcrt, p, limit):
+    """
+    w convergence loop of activation p of a task. Returns the converged w, and the task wcrt updated with the
+    response times found along the way. Stops as soon as a response time goes over the limit
+    """
+    w_prev = 0.
+    w = p * wcet
+    while w != w_prev:
+        w_prev = w
+        s = 0.
+        for i in range(len(hp_j)):
+            s += math.ceil((hp_j[i] + w) / hp_p[i]) * hp_c[i]
+        w = s + p * wcet
+        r = w - (p - 1) * period + jitter
+
+        if r > wcrt:
+            wcrt = r
+            for i in range(len(hp_j)):
+                if hp_fb[i]:
+                    hp_j[i] = r  # higher priority tasks released by this task
+        if r > limit:
+            break
+    return w, wcrt
+
+
+@njit(cache=True, nogil=True)
+def _holistic_fp_range(wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, hp_p, hp_c, wcrts, updated, start, end):
+    """Holistic FP analysis of the tasks start:end, which must be a whole system (see _holistic_fp_kernel)"""
+    changed = True
+    while changed:  # wcrt convergence loop, wcrts only grow
+        changed = False
+        for i in range(start, end):
+            lo = hp_ptr[i]
+            hi = hp_ptr[i + 1]
+            hp_j = np.empty(hi - lo)
+            for k in range(lo, hi):
+                h = pred[hp_idx[k]]
+                hp_j[k - lo] = wcrts[h] if h >= 0 else 0.
+            jitter = wcrts[pred[i]] if pred[i] >= 0 else 0.
+
+            p = 1
+            while True:
+                w, wcrt = _converge_w(hp_j, hp_p[lo:hi], hp_c[lo:hi], hp_fb[lo:hi], wcets[i], periods[i], jitter,
+                                      wcrts[i], p, limits[i])
+                r = w - (p - 1) * periods[i] + jitter
+                if wcrt > wcrts[i]:
+                    wcrts[i] = wcrt
+                    updated[i] = True
+                    changed = True
+                if r > limits[i]:
+                    return i
+                if w <= p * periods[i]:
+                    break  # no need to try more p's
+                p += 1
+    return -1
+
+
+@njit("intp(float64[::1], float64[::1], float64[::1], intp[::1], intp[::1], intp[:], bool_[::1], float64[::1], "
+      "bool_[::1])", cache=True, nogil=True)
+def _holistic_fp_kernel(wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, wcrts, updated):
+    """
+    Whole holistic FP analysis over task vectors, in system.tasks order. pred holds the index of the predecessor of
+    each task (-1 for the first task of a flow), and the higher priority tasks are given in CSR layout (see
+    HolisticFPAnalysis._task_vectors). Updates wcrts in place, flagging the tasks whose response time grew in
+    'updated'. Returns the index of the task whose response time went over its limit, or -1 if the analysis converged
+    """
+    return _holistic_fp_range(wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, periods[hp_idx], wcets[hp_idx],
+                              wcrts, updated, 0, len(wcets))
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def _holistic_fp_batch(wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, wcrts, updated, task_ptr, failed):
+    """
+    _holistic_fp_kernel over the concatenated task vectors of several systems, analyzed in parallel. The tasks of
+    system s are task_ptr[s]:task_ptr[s+1], and 'failed' receives the result of each one (a global task index or -1)
+    """
+    hp_p = periods[hp_idx]
+    hp_c = wcets[hp_idx]
+    for s in prange(len(task_ptr) - 1):
+        failed[s] = _holistic_fp_range(wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, hp_p, hp_c, wcrts,
+                                       updated, task_ptr[s], task_ptr[s + 1])
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def _holistic_fp_scenarios(wcets, periods, limits, pred, wcrts, scenarios, out):
+    """
+    _holistic_fp_kernel for each priority scenario (see holistic_fp_scenarios), analyzed in parallel. The higher
+    priority tasks of each scenario are read from its matrix, and the response times are written to its column of out
+    """
+    n = len(wcets)
+    for s in prange(scenarios.shape[0]):
+        pm = scenarios[s]
+        hp_ptr = np.zeros(n + 1, dtype=np.intp)
+        for i in range(n):
+            hp_ptr[i + 1] = hp_ptr[i] + np.count_nonzero(pm[i])
+        hp_idx = np.empty(hp_ptr[n], dtype=np.intp)
+        hp_fb = np.empty(hp_ptr[n], dtype=np.bool_)
+        for i in range(n):
+            k = hp_ptr[i]
+            for h in range(n):
+                if pm[i, h]:
+                    hp_idx[k] = h
+                    hp_fb[k] = pred[h] == i
+                    k += 1
+
+        r = wcrts.copy()
+        updated = np.zeros(n, dtype=np.bool_)
+        failed = _holistic_fp_range(wcets, periods, limits, pred, hp_ptr, hp_idx, hp_fb, periods[hp_idx],
+                                    wcets[hp_idx], r, updated, 0, n)
+        if failed >= 0:
+            # without reset, the successors of the task over its limit take its response time
+            k = failed + 1
+            while k < n and pred[k] == k - 1:
+                r[k] = r[failed]
+                k += 1
+        out[:, s] = r
+
+
+# maximum number of higher priority tasks for which an unrolled kernel is generated
+UNROLL_MAX = 8
+
+_UNROLLED_SOURCE = """
+def _converge_w_{n}(hp_j, hp_p, hp_c, hp_fb, wcet, period, jitter, wcrt, p, limit):
+    w_prev = 0.
+    w = p * wcet
+    while w != w_prev:
+        w_prev = w
+        s = 0.
+{sum}
+        w = s + p * wcet
+        r = w - (p - 1) * period + jitter
+
+        if r > wcrt:
+            wcrt = r
+            for i in range({n}):
+                if hp_fb[i]:
+                    hp_j[i] = r
+        if r > limit:
+            break
+    return w, wcrt
+"""
+
+_unrolled_kernels = {}
+
+
+def _unrolled(n):
+    """
+    Returns a version of _converge_w with the interference sum unrolled for exactly 'n' higher priority tasks,
+    generating and compiling it the first time. The terms are added in the same order as in _converge_w, so both
+    kernels give the same results. Falls back to _converge_w for more than UNROLL_MAX tasks
+    """
+    if n > UNROLL_MAX:
+        return _converge_w
+    kernel = _unrolled_kernels.get(n)
+    if kernel is None:
+        terms = "\n".join(f"        s += math.ceil((hp_j[{i}] + w) / hp_p[{i}]) * hp_c[{i}]" for i in range(n))
+        namespace = {"math": math}
+        exec(_UNROLLED_SOURCE.format(n=n, sum=terms), namespace)
+        kernel = _unrolled_kernels[n] = njit(nogil=True)(namespace[f"_converge_w_{n}"])
+    return kernel
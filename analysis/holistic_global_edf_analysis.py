@@ -1,26 +1,39 @@
 import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from model.analysis_function import reset_wcrt, init_wcrt, LimitFactorReachedException
+import numpy as np
+
+from model.analysis_function import reset_wcrt, init_wcrt, LimitFactorReachedException, processor_vectors, \
+    interfering_vectors
 from model.linear_system import Task, Processor, LinearSystem, is_scheduler_type, SchedulerType
 
 
 class HolisticGlobalEDFAnalysis:
-    def __init__(self, limit_factor=10, reset=True, verbose=False):
+    def __init__(self, limit_factor=10, reset=True, verbose=False, workers=None):
+        """
+        workers: if greater than 1, the processors are analyzed concurrently by this number of threads in each
+        iteration. Processors then see the response times updated by the others as soon as they are written, instead
+        of in processor order. The final response times are the same, but if the limit factor is reached the
+        provisional response times that are kept (reset=False) may differ from the sequential analysis
+        """
         self.limit_factor = limit_factor
         self.reset = reset
         self.verbose = verbose
+        self.workers = workers
 
     @staticmethod
     def _activations(task: Task, length: float) -> int:
         """eq (4)"""
         return math.ceil((length+task.jitter)/task.period)
 
-    def _longest_busy_period(self, proc: Processor, l_prev: float) -> float:
-        length = sum(map(lambda t: math.ceil((l_prev+t.jitter)/t.period)*t.wcet, proc.tasks))
-        if math.isclose(length, l_prev):
-            return length
-        else:
-            return self._longest_busy_period(proc, length)
+    def _longest_busy_period(self, proc: Processor, length: float) -> float:
+        tasks = proc.tasks
+        while True:
+            l_prev = length
+            length = sum(map(lambda t: math.ceil((l_prev+t.jitter)/t.period)*t.wcet, tasks))
+            if length == l_prev:
+                return length
 
     def _set_psi(self, proc: Processor, busy_period: float):
         psi = [(p-1)*task.period - task.jitter + task.deadline
@@ -34,13 +47,15 @@ class HolisticGlobalEDFAnalysis:
             return
 
         init_wcrt(system)
+        vectors = processor_vectors(system)
         try:
-            while True:
-                changed = False
-                for proc in system.processors:
-                    changed |= self._proc_analysis(proc)
-                if not changed:
-                    break
+            if self.workers and self.workers > 1:
+                # leaving the with block waits for every worker, so the response times are not written by any thread
+                # when the exception below is handled
+                with ThreadPoolExecutor(self.workers) as executor:
+                    self._iterate(system, vectors, executor)
+            else:
+                self._iterate(system, vectors, None)
         except LimitFactorReachedException as e:
             if self.verbose:
                 print(e.message)
@@ -51,21 +66,42 @@ class HolisticGlobalEDFAnalysis:
                 for task in e.task.all_successors:
                     task.wcrt = e.response_time
 
-    def _proc_analysis(self, proc: Processor):
+    def _iterate(self, system: LinearSystem, vectors: dict, executor) -> None:
+        """Analyzes the processors until the response times converge"""
+        while True:
+            if executor:
+                changed = any(list(executor.map(partial(self._proc_analysis, vectors=vectors), system.processors)))
+            else:
+                changed = False
+                for proc in system.processors:
+                    changed |= self._proc_analysis(proc, vectors)
+            if not changed:
+                break
+
+    def _proc_analysis(self, proc: Processor, vectors: dict):
+        if proc.tasks and proc.utilization >= 1:
+            # the busy period does not converge, neither do the response times
+            task = proc.tasks[0]
+            raise LimitFactorReachedException(task, math.inf, task.flow.deadline * self.limit_factor)
         length = self._longest_busy_period(proc, 0)
         changed = False
         for task in proc.tasks:
-            changed |= self._task_analysis(task, length)
+            changed |= self._task_analysis(task, length, vectors)
         return changed
 
-    def _task_analysis(self, task: Task, length: float) -> bool:
+    def _task_analysis(self, task: Task, length: float, vectors: dict) -> bool:
         max_r = 0
+        interferers = interfering_vectors(task, vectors)
         all_psi = self._set_psi(task.processor, length)
+        order = np.argsort(all_psi, kind="stable")
+        sorted_psi = np.asarray(all_psi, dtype=np.float64)[order]
         for p in range(1, self._activations(task, length) + 1):
-            activations = [psi - (p-1) * task.period + task.jitter - task.deadline for psi in all_psi
-                           if (p-1)*task.period-task.jitter+task.deadline <= psi < p*task.period-task.jitter+task.deadline]
-            for activation in activations:
-                r = self._ra(task, activation, p)
+            # psi values in [(p-1)*T-J+D, p*T-J+D), visited in their original order
+            lo, hi = np.searchsorted(sorted_psi, ((p-1)*task.period-task.jitter+task.deadline,
+                                                  p*task.period-task.jitter+task.deadline))
+            for i in np.sort(order[lo:hi]).tolist():
+                activation = all_psi[i] - (p-1) * task.period + task.jitter - task.deadline
+                r = self._ra(task, interferers, activation, p)
                 if r > max_r:
                     max_r = r
                 if r > task.flow.deadline * self.limit_factor:
@@ -77,21 +113,30 @@ class HolisticGlobalEDFAnalysis:
         else:
             return False
 
-    def _ra(self, task, activation, p):
+    def _ra(self, task, interferers, activation, p):
         deadline_activation = activation - task.jitter + (p-1)*task.period + task.deadline
-        wa = self._wa(task, deadline_activation, p, 0)
+        wa = self._wa(task, interferers, deadline_activation, p, 0)
         ra = wa - activation + task.jitter - (p-1)*task.period
         return ra
 
-    def _wa(self, task, deadline_activation, p, wa_prev):
-        wa = p*task.wcet + sum(map(lambda t: self._wi(t, wa_prev, deadline_activation),
-                                   [t for t in task.processor.tasks if t != task]))
-        if math.isclose(wa, wa_prev):
-            return wa
-        else:
-            return self._wa(task, deadline_activation, p, wa)
+    def _wa(self, task, interferers, deadline_activation, p, wa):
+        pd = self._pd(interferers, deadline_activation)  # does not change during the iterations
+        # w only grows, and the activations of each interferer are capped by pd, so the loop ends
+        while True:
+            wa_prev = wa
+            # added in order: np.sum rounds the partial sums differently, which can move a ceil or floor
+            wa = p*task.wcet + sum(self._wi(interferers, wa_prev, pd).tolist())
+            if wa == wa_prev:
+                return wa
+
+    @staticmethod
+    def _pd(interferers, D: float) -> np.ndarray:
+        """Term of the interference that only depends on D"""
+        jitters, periods, _, deadlines = interferers
+        return np.floor((jitters + D - deadlines)/periods)+1
 
     @staticmethod
-    def _wi(task: Task, t: float, D: float) -> float:
-        value = min(math.ceil((t+task.jitter)/task.period), math.floor((task.jitter + D - task.deadline)/task.period)+1)
-        return value * task.wcet if value > 0 else 0
\ No newline at end of file
+    def _wi(interferers, t: float, pd: np.ndarray) -> np.ndarray:
+        jitters, periods, wcets, _ = interferers
+        value = np.minimum(np.ceil((t+jitters)/periods), pd)
+        return value.clip(min=0) * wcets
\ No newline at end of file
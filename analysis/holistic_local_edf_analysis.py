@@ -1,6 +1,10 @@
 import math
+from bisect import bisect_left
 
-from model.analysis_function import reset_wcrt, init_wcrt, LimitFactorReachedException, AnalysisFunction
+import numpy as np
+
+from model.analysis_function import reset_wcrt, init_wcrt, LimitFactorReachedException, processor_vectors, \
+    interfering_vectors, AnalysisFunction
 from model.linear_system import Task, LinearSystem, SchedulerType, is_scheduler_type
 
 
@@ -16,39 +20,47 @@ class HolisticLocalEDFAnalysis(AnalysisFunction):
         self.verbose = verbose
 
     @staticmethod
-    def _wi(task: Task, t: float, D: float) -> float:
-        """Eq (1)"""
-        pl = math.ceil((t + task.jitter) / task.period)
-        pd = 0 if D < task.deadline else math.floor((task.jitter + D - task.deadline) / task.period) + 1
-        m = min(pl, pd)
-        return m * task.wcet if m > 0 else 0
+    def _pd(interferers, D: float) -> np.ndarray:
+        """Term of eq (1) that only depends on D, for every interfering task"""
+        jitters, periods, _, deadlines = interferers
+        return np.where(D < deadlines, 0, np.floor((jitters + D - deadlines) / periods) + 1)
+
+    @staticmethod
+    def _wi(interferers, t: float, pd: np.ndarray) -> np.ndarray:
+        """Eq (1), for every interfering task. 'pd' is the term that only depends on D (see _pd)"""
+        jitters, periods, wcets, _ = interferers
+        pl = np.ceil((t + jitters) / periods)
+        return np.minimum(pl, pd).clip(min=0) * wcets
 
     @classmethod
-    def _busy_period(cls, task: Task, l_prev: float) -> float:
+    def _busy_period(cls, task: Task, interferers, length: float) -> float:
         """Eq (5) [adapted from Mast implementation]"""
-        own = math.ceil(l_prev / task.period) * task.wcet
-        tasks = [t for t in task.processor.tasks if t != task]
-        length = own + sum(map(lambda t: math.ceil((l_prev + t.jitter) / t.period) * t.wcet, tasks))
-        if math.isclose(length, l_prev):
-            return length
-        else:
-            return cls._busy_period(task, length)
+        jitters, periods, wcets, _ = interferers
+        while True:
+            l_prev = length
+            own = math.ceil(l_prev / task.period) * task.wcet
+            # added in order: np.sum and @ round the partial sums differently, which can move a ceil or floor
+            length = own + sum((np.ceil((l_prev + jitters) / periods) * wcets).tolist())
+            if length == l_prev:
+                return length
 
     @classmethod
-    def _build_set_psi(cls, task: Task, busy_period: float, p: int):
-        # eq (4) [adapted from Mast implementation]
-        tasks = [t for t in task.processor.tasks if t != task]
-        psi_ij = {(p - 1) * t.period - t.jitter + t.deadline
-                  for t in tasks for p in range(1, math.ceil((busy_period + t.jitter) / t.period) + 1)
-                  if (p - 1) * t.period - t.jitter >= 0}
-        psi_ij |= {t.deadline for t in tasks}
+    def _build_set_psi(cls, task: Task, interferers, busy_period: float) -> list[float]:
+        """Sorted values of the set psi, without duplicates"""
+        jitters, periods, _, deadlines = interferers
+
+        # eq (4) [adapted from Mast implementation]: p-1 = 0..ceil((L+J)/T)-1 for every interfering task
+        counts = np.ceil((busy_period + jitters) / periods).clip(min=0).astype(np.intp)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        ps = (np.arange(counts.sum()) - starts).astype(np.float64)
+        offsets = ps * np.repeat(periods, counts) - np.repeat(jitters, counts)
+        psi_ij = (offsets + np.repeat(deadlines, counts))[offsets >= 0]
 
         # Eq (6)
-        psi_ab = {(p - 1) * task.period + task.deadline
-                  for p in range(1, math.ceil(busy_period / task.period) + 1)}
+        ps = np.arange(math.ceil(busy_period / task.period), dtype=np.float64)
+        psi_ab = ps * task.period + task.deadline
 
-        set_psi = psi_ij | psi_ab
-        return set_psi
+        return np.unique(np.concatenate((psi_ij, deadlines, psi_ab))).tolist()
 
     @staticmethod
     def _ra(task, psi, wab):
@@ -57,14 +69,15 @@ class HolisticLocalEDFAnalysis(AnalysisFunction):
         return rab
 
     @classmethod
-    def _wab(cls, task, psi, p, wab_prev):
+    def _wab(cls, task, interferers, psi, p, wab):
         """Eq (8)"""
-        wab = p * task.wcet + sum(map(lambda t: cls._wi(t, wab_prev, psi),
-                                      [t for t in task.processor.tasks if t != task]))
-        if math.isclose(wab, wab_prev):
-            return wab
-        else:
-            return cls._wab(task, psi, p, wab)
+        pd = cls._pd(interferers, psi)  # does not change during the iterations
+        # w only grows, and the activations of each interferer are capped by pd, so the loop ends
+        while True:
+            wab_prev = wab
+            wab = p * task.wcet + sum(cls._wi(interferers, wab_prev, pd).tolist())  # added in order, see _busy_period
+            if wab == wab_prev:
+                return wab
 
     def apply(self, system: LinearSystem) -> None:
         if not is_scheduler_type(system, SchedulerType.EDF):
@@ -73,11 +86,12 @@ class HolisticLocalEDFAnalysis(AnalysisFunction):
             return
 
         init_wcrt(system)
+        vectors = processor_vectors(system)
         try:
             while True:
                 changed = False
                 for task in system.tasks:
-                    changed |= self._task_analysis(task)
+                    changed |= self._task_analysis(task, vectors)
                 if not changed:
                     break
         except LimitFactorReachedException as e:
@@ -90,23 +104,49 @@ class HolisticLocalEDFAnalysis(AnalysisFunction):
                 for task in e.task.all_successors:
                     task.wcrt = e.response_time
 
-    def _task_analysis(self, task: Task) -> bool:
-        """task: task under analysis"""
-        length = self._busy_period(task, task.wcet)
+    def _task_analysis(self, task: Task, vectors: dict) -> bool:
+        """task: task under analysis. vectors: see processor_vectors"""
+        interferers = interfering_vectors(task, vectors)
+        if task.processor.utilization >= 1:
+            # the busy period does not converge, neither do the response times
+            raise LimitFactorReachedException(task, math.inf, task.flow.deadline * self.limit_factor)
+        length = self._busy_period(task, interferers, task.wcet)
         max_r = 0
+        all_psi = self._build_set_psi(task, interferers, length)
         for p in range(1, math.ceil(length / task.period) + 1):
-            psi_set = {psi for psi in self._build_set_psi(task, length, p) if
-                       (p - 1) * task.period + task.deadline <= psi < p * task.period + task.deadline}
-            for psi in psi_set:
-                w = self._wab(task, psi, p, p * task.wcet)  # converges to a w value
+            # psi values in [(p-1)*T+D, p*T+D)
+            lo = bisect_left(all_psi, (p - 1) * task.period + task.deadline)
+            hi = bisect_left(all_psi, p * task.period + task.deadline, lo)
+            for psi in all_psi[lo:hi]:
+                w = self._wab(task, interferers, psi, p, p * task.wcet)  # converges to a w value
                 r = self._ra(task, psi, w)
                 if r > max_r:
                     max_r = r
                 if r > task.flow.deadline * self.limit_factor:
-                    raise LimitFactorReachedException(task, r, task.flow.deadline * self.limit_factor)
+                    raise self._limit_reached(task, interferers, length, p, task.flow.deadline * self.limit_factor)
 
         if max_r > task.wcrt:
             task.wcrt = max_r
             return True
         else:
             return False
+
+    def _limit_reached(self, task: Task, interferers, length: float, p: int, limit: float):
+        """
+        Exception for activation p, where some psi reached the limit. With reset=False the provisional response time
+        that is kept is the one of the first psi over the limit, and the psi values of p used to be visited in the
+        iteration order of a set. That set is built here, as before, so the same response time is kept
+        """
+        tasks = [t for t in task.processor.tasks if t is not task]
+        psi_ij = {(q - 1) * t.period - t.jitter + t.deadline
+                  for t in tasks for q in range(1, math.ceil((length + t.jitter) / t.period) + 1)
+                  if (q - 1) * t.period - t.jitter >= 0}
+        psi_ij |= {t.deadline for t in tasks}
+        psi_ab = {(q - 1) * task.period + task.deadline for q in range(1, math.ceil(length / task.period) + 1)}
+        set_psi = psi_ij | psi_ab
+
+        lo, hi = (p - 1) * task.period + task.deadline, p * task.period + task.deadline
+        for psi in {psi for psi in set_psi if lo <= psi < hi}:
+            r = self._ra(task, psi, self._wab(task, interferers, psi, p, p * task.wcet))
+            if r > limit:
+                return LimitFactorReachedException(task, r, limit)
@@ -1,5 +1,7 @@
 from random import Random
 
+import numpy as np
+
 from model.analysis_function import AnalysisFunction, globalize_deadlines, calculate_priorities, normalize_priorities
 from model.linear_system import LinearSystem
 from utils.exec_time import ExecTime
@@ -24,11 +26,23 @@ class PDAssignment(AnalysisFunction):
 
     @staticmethod
     def calculate_local_deadlines(system):
-        for flow in system:
-            sum_wcet = sum(map(lambda t: t.wcet, flow.tasks))
-            for task in flow:
-                d = task.wcet * flow.deadline / sum_wcet
-                task.deadline = d
+        flows = [flow for flow in system if flow.tasks]
+        if not flows:
+            return
+        tasks = [task for flow in flows for task in flow]
+
+        # every flow is a contiguous segment of the tasks vectors
+        counts = np.fromiter((len(flow.tasks) for flow in flows), dtype=np.intp, count=len(flows))
+        wcets = np.fromiter((task.wcet for task in tasks), dtype=np.float64, count=len(tasks))
+        # the wcets of each flow are added in order. np.add.reduceat would use pairwise summation, giving slightly
+        # different deadlines
+        starts = np.cumsum(counts) - counts
+        sum_wcets = np.array([np.cumsum(wcets[start:start+n])[-1] for start, n in zip(starts, counts)])
+        flow_deadlines = np.fromiter((flow.deadline for flow in flows), dtype=np.float64, count=len(flows))
+
+        deadlines = wcets * np.repeat(flow_deadlines, counts) / np.repeat(sum_wcets, counts)
+        for task, d in zip(tasks, deadlines.tolist()):
+            task.deadline = d
 
 
 class PassthroughAssignment:
@@ -47,8 +61,13 @@ class RandomAssignment:
 
     def apply(self, system: LinearSystem):
         tasks = system.tasks
-        self.random.shuffle(tasks)
-        for task, priority in zip(tasks, range(1, len(tasks)+1)):
+        order = list(range(len(tasks)))
+        self.random.shuffle(order)
+
+        # the i-th task in the shuffled order gets priority i+1
+        priorities = np.empty(len(tasks), dtype=np.int64)
+        priorities[order] = np.arange(1, len(tasks)+1)
+        for task, priority in zip(tasks, priorities.tolist()):
             task.priority = priority
         if self.normalize:
             normalize_priorities(system)
@@ -61,13 +80,10 @@ class EQSAssignment:
 
     @staticmethod
     def compute_deadlines(system: LinearSystem):
-        for flow in system:
-            s = 0
-            n = len(flow.tasks)
-            for j in reversed(range(len(flow.tasks))):
-                task = flow[j]
-                s += task.wcet
-                task.deadline = task.wcet + (flow.deadline - s)/(n - (j+1) + 1)
+        tasks, wcets, sums, remaining, flow_deadlines = _reverse_sums(system)
+        deadlines = wcets + (flow_deadlines - sums)/remaining
+        for task, d in zip(tasks, deadlines.tolist()):
+            task.deadline = d
 
 
 class EQFAssignment:
@@ -77,10 +93,26 @@ class EQFAssignment:
 
     @staticmethod
     def compute_deadlines(system: LinearSystem):
-        for flow in system:
-            s = 0
-            n = len(flow.tasks)
-            for j in reversed(range(len(flow.tasks))):
-                task = flow[j]
-                s += task.wcet
-                task.deadline = task.wcet + (flow.deadline-s)*(task.wcet/s)
\ No newline at end of file
+        tasks, wcets, sums, _, flow_deadlines = _reverse_sums(system)
+        deadlines = wcets + (flow_deadlines-sums)*(wcets/sums)
+        for task, d in zip(tasks, deadlines.tolist()):
+            task.deadline = d
+
+
+def _reverse_sums(system: LinearSystem):
+    """
+    Task vectors used by EQS and EQF: wcets, sum of the wcets from each task to the end of its flow, number of tasks
+    from each task to the end of its flow, and deadline of the flow
+    """
+    flows = [flow for flow in system if flow.tasks]
+    tasks = [task for flow in flows for task in flow]
+    if not flows:
+        return tasks, *(np.empty(0) for _ in range(4))
+
+    wcets = np.fromiter((task.wcet for task in tasks), dtype=np.float64, count=len(tasks))
+    counts = [len(flow.tasks) for flow in flows]
+    starts = np.cumsum(counts) - counts
+    sums = np.concatenate([np.cumsum(wcets[start:start+n][::-1])[::-1] for start, n in zip(starts, counts)])
+    remaining = np.concatenate([np.arange(n, 0, -1, dtype=np.float64) for n in counts])
+    flow_deadlines = np.repeat([flow.deadline for flow in flows], counts).astype(np.float64)
+    return tasks, wcets, sums, remaining, flow_deadlines
@@ -1,9 +1,10 @@
 import sys
 
+import numpy as np
+
 from assignment.assignments import PDAssignment
-from model.analysis_function import globalize_deadlines, extract_assignment, insert_assignment, calculate_priorities, \
-    normalize_priorities, AnalysisFunction
-from model.linear_system import LinearSystem, Task, Processor, Flow
+from model.analysis_function import globalize_deadlines, calculate_priorities, normalize_priorities, AnalysisFunction
+from model.linear_system import LinearSystem
 from utils.exec_time import ExecTime
 
 
@@ -39,10 +40,12 @@ class HOPAssignment(AnalysisFunction):
         PDAssignment.calculate_local_deadlines(system)
         if self.globalize:
             globalize_deadlines(system)
-        best_assignment = extract_assignment(system)
+        best_assignment = np.empty((2, len(system.tasks)), dtype=object)  # priorities keep their type
+        _snapshot_into(best_assignment, system)
+        indices = self.system_indices(system)
 
         for ka, kr in self.k_pairs:
-            insert_assignment(system, best_assignment)  # always start each new k-pair iteration with the best
+            _restore_from(best_assignment, system)  # always start each new k-pair iteration with the best
 
             for i in range(self.iterations):
                 iteration += 1
@@ -58,39 +61,39 @@ class HOPAssignment(AnalysisFunction):
                     self.callback.apply(system)
 
                 slack = system.slack
+                schedulable = system.is_schedulable()
                 if slack > best_slack:
                     best_slack = slack
-                    best_assignment = extract_assignment(system)
+                    _snapshot_into(best_assignment, system)
 
                 if self.verbose:
-                    sched = "SCHEDULABLE" if system.is_schedulable() else "NOT SCHEDULABLE"
-                    print(f"slack={system.slack} {sched}")
+                    sched = "SCHEDULABLE" if schedulable else "NOT SCHEDULABLE"
+                    print(f"slack={slack} {sched}")
 
-                if system.is_schedulable() and self.iterations_to_sched < 0:
+                if schedulable and self.iterations_to_sched < 0:
                     self.iterations_to_sched = iteration
 
-                if system.is_schedulable() and over_iterations > 0:
+                if schedulable and over_iterations > 0:
                     optimizing = True
 
                 if optimizing:
                     over_iterations -= 1
 
-                if (not optimizing and system.is_schedulable()) or patience <= 0:
+                if (not optimizing and schedulable) or patience <= 0:
                     stop = True
                     break
                 elif optimizing and over_iterations < 0 or patience <= 0:
                     stop = True
                     break
 
-                self.update_local_deadlines(system, ka, kr)
+                self.update_local_deadlines(system, ka, kr, indices)
                 if self.globalize:
                     globalize_deadlines(system)
 
             if stop:
                 break
 
-        self.delete_excesses(system)
-        insert_assignment(system, best_assignment)
+        _restore_from(best_assignment, system)
         self.exec_time.stop()
         system.apply(self.analysis)
         if self.verbose:
@@ -99,70 +102,81 @@ class HOPAssignment(AnalysisFunction):
         if self.normalize:
             normalize_priorities(system)
 
-    def update_local_deadlines(self, system: LinearSystem, ka, kr):
-        # update excesses with last response times
-        for task in system.tasks: self.save_task_excess(task)
-        for proc in system.processors: self.save_proc_excess(proc)
-        for flow in system.flows: self.save_flow_mex(flow)
-        self.save_proc_mex(system)
-
-        # calculate unadjusted local deadlines
-        for task in system.tasks:
-            self.save_local_deadline(task, ka, kr)
-
-        # adjust local deadlines
-        self.adjust_local_deadlines(system)
-
-    @staticmethod
-    def save_local_deadline(task: Task, ka, kr):
-        mex_pr = task.flow.system.mex_pr
-        second = 1 + task.processor.excess/(kr * mex_pr) if kr * mex_pr != 0 else sys.float_info.max
-        third = 1 + task.excess/(ka * task.flow.excess) if ka * task.flow.excess != 0 else sys.float_info.max
-        task.deadline = task.deadline * second * third
-
-    @staticmethod
-    def save_task_excess(task: Task):
-        d = task.deadline
-        e = 0
-        if d <= task.period:
-            e = (task.wcrt-d)*task.flow.wcrt/task.flow.deadline
-        elif d > task.period:
-            e = (task.wcrt+task.jitter-d)*task.flow.wcrt/task.flow.deadline
-        task.excess = e
-
-    @staticmethod
-    def save_proc_excess(proc: Processor):
-        proc.excess = sum([task.excess for task in proc.tasks])
-
     @staticmethod
-    def save_flow_mex(flow: Flow):
-        excesses = [abs(task.excess) for task in flow.tasks]
-        flow.excess = max(excesses) if len(excesses) > 0 else 0
+    def system_indices(system: LinearSystem):
+        """Flow and processor index of every task, in system.tasks order. They do not change during HOPA"""
+        procs = system.processors
+        flow_idx = np.array([i for i, flow in enumerate(system.flows) for _ in flow.tasks], dtype=np.intp)
+        proc_idx = np.array([procs.index(task.processor) for task in system.tasks], dtype=np.intp)
+        return flow_idx, proc_idx
+
+    def update_local_deadlines(self, system: LinearSystem, ka, kr, indices=None):
+        flow_idx, proc_idx = indices if indices else self.system_indices(system)
+        tasks = system.tasks
+        flows = system.flows
+        wcrts = np.array([task.wcrt for task in tasks], dtype=np.float64)
+        deadlines = np.array([task.deadline for task in tasks], dtype=np.float64)
+        periods = np.array([task.period for task in tasks], dtype=np.float64)
+        jitters = np.array([task.jitter for task in tasks], dtype=np.float64)
+        flow_wcrts = np.array([flow.wcrt for flow in flows], dtype=np.float64)
+        flow_deadlines = np.array([flow.deadline for flow in flows], dtype=np.float64)
+
+        with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+            # update excesses with last response times
+            task_excess = self.task_excesses(wcrts, deadlines, periods, jitters, flow_wcrts, flow_deadlines, flow_idx)
+            proc_excess = np.bincount(proc_idx, weights=task_excess, minlength=len(system.processors))
+            flow_mex = np.zeros(len(flows))
+            np.maximum.at(flow_mex, flow_idx, np.abs(task_excess))
+            mex_pr = np.abs(proc_excess).max(initial=0)
+
+            # calculate unadjusted local deadlines
+            deadlines = self.local_deadlines(deadlines, task_excess, proc_excess[proc_idx], flow_mex[flow_idx],
+                                             mex_pr, ka, kr)
+
+            # adjust local deadlines
+            deadlines = self.adjust_local_deadlines(deadlines, flow_deadlines, flow_idx)
+
+        for task, d in zip(tasks, deadlines.tolist()):
+            task.deadline = d
 
     @staticmethod
-    def save_proc_mex(system: LinearSystem):
-        excesses = [abs(proc.excess) for proc in system.processors]
-        system.mex_pr = max(excesses) if len(excesses) > 0 else 0
+    def local_deadlines(deadlines, task_excess, proc_excess, flow_mex, mex_pr, ka, kr):
+        """Unadjusted local deadlines. Excesses of the processor and flow of each task are given as task vectors"""
+        second = 1 + proc_excess/(kr * mex_pr) if kr * mex_pr != 0 else np.full_like(deadlines, sys.float_info.max)
+        den = ka * flow_mex
+        third = np.where(den != 0, 1 + task_excess/den, sys.float_info.max)
+        return deadlines * second * third
 
     @staticmethod
-    def delete_excesses(system: LinearSystem):
-        for task in system.tasks:
-            if hasattr(task, "excess"): del task.excess
-        for flow in system.flows:
-            if hasattr(flow, "excess"): del flow.excess
-        for proc in system.processors:
-            if hasattr(proc, "excess"): del proc.excess
-        if hasattr(system, "mex_pr"): del system.mex_pr
+    def task_excesses(wcrts, deadlines, periods, jitters, flow_wcrts, flow_deadlines, flow_idx):
+        """Excess of every task, scaled by the response time/deadline ratio of its flow"""
+        e = np.where(deadlines <= periods, wcrts - deadlines,
+                     np.where(deadlines > periods, wcrts + jitters - deadlines, 0))
+        return e * flow_wcrts[flow_idx] / flow_deadlines[flow_idx]
 
     @staticmethod
-    def adjust_local_deadlines(system: LinearSystem):
-        for flow in system.flows:
-            d_sum = sum([task.deadline for task in flow])
-            for task in flow:
-                task.deadline = task.deadline * flow.deadline / d_sum
+    def adjust_local_deadlines(deadlines, flow_deadlines, flow_idx):
+        """Scales the local deadlines so each flow's add up to its end-to-end deadline"""
+        d_sums = np.bincount(flow_idx, weights=deadlines, minlength=len(flow_deadlines))
+        return deadlines * flow_deadlines[flow_idx] / d_sums[flow_idx]
 
     @staticmethod
     def clean_response_times(system):
         for task in system.tasks:
             if task.wcrt is None:
-                task.wcrt = sys.float_info.max
\ No newline at end of file
+                task.wcrt = sys.float_info.max
+
+
+def _snapshot_into(snap: np.ndarray, system: LinearSystem):
+    """Copies the priorities and local deadlines of the tasks into the rows of 'snap'. HOPA does not change the
+    mapping, so processors are not part of the snapshot"""
+    for i, task in enumerate(system.tasks):
+        snap[0, i] = task.priority
+        snap[1, i] = task.deadline
+
+
+def _restore_from(snap: np.ndarray, system: LinearSystem):
+    """Inverse of _snapshot_into"""
+    for task, priority, deadline in zip(system.tasks, *snap.tolist()):
+        task.priority = priority
+        task.deadline = deadline
@@ -1,9 +1,13 @@
+import hashlib
+import inspect
+import shelve
+from functools import partial
+
 from model.analysis_function import reset_wcrt
 from examples.generator import set_utilization
 from model.linear_system import LinearSystem
 import numpy as np
 from multiprocessing import Pool
-from functools import partial
 import matplotlib.pyplot as plt
 import pandas as pd
 import time
@@ -17,7 +21,7 @@ RESET = '\033[0m'
 class SchedRatioEval:
     """Class to perform a Schedulability Ratio evaluation over a utilization series"""
     def __init__(self, name, labels, funcs, systems, utilizations, threads,
-                 preprocessor=None, utilization_func=set_utilization):
+                 preprocessor=None, utilization_func=set_utilization, cache_file=None, cache_version=None):
         assert len(labels) == len(funcs)
         self.name = name                    # name of the study. used to name output files
         self.labels = labels                # label for each function (same length as funcs)
@@ -26,58 +30,106 @@ class SchedRatioEval:
         self.utilizations = utilizations    # utilizations array (usually: each number between [0,1], and increasing)
         self.threads = threads              # number of CPU threads to use
         self.preprocessor = preprocessor    # function to pre-process system before analyzing it (optional)
-        self.utilization_func = utilization_func  # function to set the system utilization
+        self.utilization_func = utilization_func  # function to set the system utilization (only changes WCETs)
+        self.cache_file = cache_file        # optional shelve file with the results of previous runs (see _cache_key)
+        self.cache_version = cache_version  # part of the cache keys, change it to discard the cached results
         self.start = None                   # starting time
 
     def run(self):
         self.start = time.time()
-        job = 0
         results = np.zeros((len(self.utilizations), len(self.labels)))          # schedulability ratio
         running_times = np.zeros((len(self.utilizations), len(self.labels)))    # execution times
+        measured = np.zeros((len(self.utilizations), len(self.labels)))         # jobs with a measured time
 
+        # every (utilization, system, function) triple is an independent job. The utilizations are set in order in
+        # this process, and each job carries the WCETs of its system at its utilization
+        jobs = []
+        keys = {}
+        if self.cache_file:
+            preprocessor_version = _source_hash(self.preprocessor)
+            versions = [(_source_hash(func), preprocessor_version, self.cache_version) for func in self.funcs]
         for u_index, u in enumerate(self.utilizations):
-            # set utilization to every system
             for s in self.systems:
                 self.utilization_func(s, u)
+            for i, s in enumerate(self.systems):
+                wcets = [t.wcet for t in s.tasks]
+                jobs.extend((u_index, i, f, wcets) for f in range(len(self.funcs)))
+                if self.cache_file:
+                    keys.update(((u_index, i, f), self._cache_key(f, s, versions[f])) for f in range(len(self.funcs)))
+
+        # functions are expected in decreasing cost order (e.g. gradient descent before PD): the expensive jobs start
+        # first, and the cheap ones fill the workers while the last expensive jobs finish
+        jobs.sort(key=lambda job: job[2])
+        pending = np.full(len(self.utilizations), len(self.systems) * len(self.funcs))
+        done = 0
+
+        def record(u_index, i, f, sched, elapsed=None):
+            """elapsed is None for the cached results: their times were measured in another run, so they are not
+            averaged with the ones of this run"""
+            nonlocal done
+            results[u_index, f] += sched
+            if elapsed is not None:
+                running_times[u_index, f] += elapsed
+                measured[u_index, f] += 1
+            done += 1
+            print(f"{datetime.now()} : u={self.utilizations[u_index]} job={done}")
+
+            # update results file when all the jobs of a utilization are finished
+            pending[u_index] -= 1
+            if pending[u_index] == 0:
+                self._save(results, "schedulables")
+                self._save(running_times/np.maximum(measured, 1), "times", show=False)
+
+        cache = shelve.open(self.cache_file) if self.cache_file else None
+        try:
+            if cache is not None:
+                cached = [job for job in jobs if keys[job[:3]] in cache]
+                jobs = [job for job in jobs if keys[job[:3]] not in cache]
+                for u_index, i, f, _ in cached:
+                    record(u_index, i, f, cache[keys[u_index, i, f]])
+
+            # every worker receives a copy of this evaluation (and its systems) once, when it starts
+            if jobs:
+                with Pool(self.threads, initializer=_init_worker, initargs=(self,)) as pool:
+                    for u_index, i, f, sched, elapsed in pool.imap_unordered(_worker_step, jobs, chunksize=1):
+                        if cache is not None:
+                            cache[keys[u_index, i, f]] = sched
+                        record(u_index, i, f, sched, elapsed)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def _cache_key(self, f: int, system: LinearSystem, version: tuple) -> str:
+        """
+        Key of the result of function f on the system, in its current state. Functions are identified by their label
+        and by 'version': the hashes of the modules that define the function and the preprocessor (see _source_hash),
+        and cache_version. Changes in other modules, e.g. in the analyses, are not detected: set a new cache_version,
+        or delete the cache file, when they change
+        """
+        state = (self.labels[f], version,
+                 [(proc.name, proc.sched, proc.local) for proc in system.processors],
+                 [(flow.name, flow.period, flow.deadline, flow.phase) for flow in system.flows],
+                 [(task.name, task.wcet, task.bcet, task.deadline, task.priority,
+                  task.processor.name if task.processor else None, task.type)
+                  for task in system.tasks])
+        return hashlib.sha1(repr(state).encode()).hexdigest()
 
-            # finish all the executions for one utilization before advancing to the next utilization
-            # use a thread pool to accelerate the execution
-            # each thread analyzes each system (no 2 threads analyze the same system at the same time)
-            with Pool(self.threads) as pool:
-                f = partial(self._step, u_index=u_index)
-                for scheds, times in pool.imap_unordered(f, self.systems):
-                    job += 1
-                    results[u_index, :] += scheds
-                    running_times[u_index, :] += times
-                    print(f"{datetime.now()} : u={u} job={job}")
-
-            # update results file
-            self._save(results, "schedulables")
-            self._save(running_times/len(self.systems), "times", show=False)
-
-    def _step(self, system: LinearSystem, u_index: int):
-        """Make sure I leave the system in the same state as before"""
-        results = np.zeros(len(self.funcs), dtype=np.int8)
-        times = np.zeros(len(self.funcs), dtype=np.single)
+    def _step(self, system: LinearSystem, f: int):
+        """Evaluates function f on the system. Make sure I leave the system in the same state as before"""
         a = backup_assignment(system)
-        for f, func in enumerate(self.funcs):
-            try:
-                if self.preprocessor:
-                    self.preprocessor(system)
-                reset_wcrt(system)
-                before = time.perf_counter()
-                sched = func(system)
-                after = time.perf_counter()
-                restore_assignment(system, a)
-                if sched:
-                    results[f] = 1
-                times[f] = after - before
-            except Exception as e:
-                print(f"{RED}Error in {self.labels[f]}, system={system.name}\n{e}{RESET}")
-                restore_assignment(system, a)
-                results[f] = 0
-                times[f] = 0
-        return results, times
+        try:
+            if self.preprocessor:
+                self.preprocessor(system)
+            reset_wcrt(system)
+            before = time.perf_counter()
+            sched = self.funcs[f](system)
+            after = time.perf_counter()
+            restore_assignment(system, a)
+            return (1 if sched else 0), np.single(after - before)
+        except Exception as e:
+            print(f"{RED}Error in {self.labels[f]}, system={system.name}\n{e}{RESET}")
+            restore_assignment(system, a)
+            return 0, np.single(0)
 
     def _save(self, data, suffix, show=True):
         label = f"{self.name}_{suffix}"
@@ -133,3 +185,37 @@ class SchedRatioEval:
                           index=self.utilizations,
                           columns=self.labels)
         df.to_excel(f"{label}.xlsx")
+
+
+def _source_hash(func) -> str:
+    """Hash of the source code of the module that defines the function (partials are unwrapped), None for None"""
+    if func is None:
+        return None
+    while isinstance(func, partial):
+        func = func.func
+    try:
+        source = inspect.getsource(inspect.getmodule(func))
+    except (TypeError, OSError):
+        # no source available (e.g. builtins), fall back to the name of the function
+        source = getattr(func, "__qualname__", repr(type(func)))
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+# evaluation copied into each worker process by the pool initializer
+_worker_eval: SchedRatioEval = None
+
+
+def _init_worker(evaluation: SchedRatioEval):
+    global _worker_eval
+    _worker_eval = evaluation
+
+
+def _worker_step(job):
+    """Sets the WCETs computed by the parent process into the worker's copy of the system, and evaluates one function.
+    The utilization function only changes the WCETs, and _step leaves the rest of the system as it was"""
+    u_index, i, f, wcets = job
+    system = _worker_eval.systems[i]
+    for task, wcet in zip(system.tasks, wcets):
+        task.wcet = wcet
+    sched, elapsed = _worker_eval._step(system, f)
+    return u_index, i, f, sched, elapsed
@@ -71,7 +71,7 @@ def generate_system(random: Random, n_flows, n_tasks, n_procs, utilization, sche
     # if balanced=True, balance the number of tasks per processor (ignore current mapping)
     if balanced:
         # r = Random(len(system.tasks))
-        tasks = system.tasks
+        tasks = list(system.tasks)  # shuffle a copy, system.tasks is cached by the system
         random.shuffle(tasks)
         for i, task in enumerate(tasks):
             task.processor = procs[i % len(procs)]
@@ -139,10 +139,10 @@ def copy(system: LinearSystem):
     for flow in system:
         new_flow = Flow(name=flow.name, period=flow.period, deadline=flow.deadline)
 
-        for task in flow:
-            new_task = task.copy()
-            new_task.processor = new_procs[task.processor.name]
-            new_flow.add_tasks(new_task)
+        new_tasks = Task.bulk_clone(flow.tasks)
+        for new_task in new_tasks:
+            new_task.processor = new_procs[new_task.processor.name]
+        new_flow.add_tasks(*new_tasks)
         new_system.add_flows(new_flow)
 
     return new_system
@@ -1,3 +1,6 @@
+from collections import OrderedDict
+from threading import Lock
+
 from gradient_descent.interfaces import CostFunction, ParameterHandler
 from model.linear_system import LinearSystem
 from model.linear_system_utils import backup_assignment, restore_assignment
@@ -5,17 +8,104 @@ from model.analysis_function import AnalysisFunction
 
 
 class InvslackCost(CostFunction):
-    def __init__(self, parameter_handler: ParameterHandler, analysis: AnalysisFunction):
+    def __init__(self, parameter_handler: ParameterHandler, analysis: AnalysisFunction, cache_size=1024):
         self.parameter_handler = parameter_handler
         self.analysis = analysis
+        self.cache_size = cache_size    # max number of memoized evaluations (LRU). 0 disables the cache
+        self._cache = OrderedDict()
+        self._lock = Lock()         # the cache may be shared by several threads (see SequentialGradientFunction)
 
     def reset(self):
         self.parameter_handler.reset()
+        with self._lock:
+            self._cache.clear()
+        if hasattr(self.analysis, "clear_cache"):
+            self.analysis.clear_cache()    # e.g. MemoizedHolisticFPAnalysis, the next system may be a different one
 
     def compute(self, S: LinearSystem, x: [float]) -> float:
-        a = backup_assignment(S)
+        return self.compute_batch(S, [x])[0]
+
+    def compute_batch(self, S: LinearSystem, xs: [[float]]) -> [float]:
+        # every x is inserted into the same assignment, so it is backed up only once
+        fields = self.parameter_handler.affected_fields()
+        a = backup_assignment(S, fields)
+        a_key = self._assignment_key(S, a, fields)
+        return [self._evaluate(S, x, a, fields, (self._x_key(x), a_key)) for x in xs]
+
+    def _evaluate(self, S: LinearSystem, x: [float], a, fields, key) -> float:
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None:
+            cost, wcrts = cached
+            for task, wcrt in zip(S.tasks, wcrts):
+                task.wcrt = wcrt    # leave the system as if the analysis was executed
+            return cost
+
         self.parameter_handler.insert(S, x)
         self.analysis.apply(S)
-        cost = max([(flow.wcrt - flow.deadline) / flow.deadline for flow in S.flows])
-        restore_assignment(S, a)
-        return cost
\ No newline at end of file
+        cost = max((flow.wcrt - flow.deadline) / flow.deadline for flow in S.flows)
+        restore_assignment(S, a, fields)
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[key] = (cost, [task.wcrt for task in S.tasks])
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return cost
+
+    @staticmethod
+    def _assignment_key(S: LinearSystem, a, fields):
+        """
+        Backup of the assignment as part of a cache key. Processors are replaced by their position in the system, so
+        copies of the same system (see SequentialGradientFunction) share their entries
+        """
+        if "processor" not in fields:
+            return a
+        index = {proc: i for i, proc in enumerate(S.processors)}
+        return tuple(tuple(index.get(p) for p in values) if field == "processor" else values
+                     for field, values in zip(fields, a))
+
+    @staticmethod
+    def _x_key(x):
+        """
+        Cache keys are (x key, assignment): the cost of x also depends on the assignment it is inserted into (e.g.
+        deadlines are scaled by the current maximum deadline). Task attributes not written by the parameter handler
+        are assumed not to change until the next reset
+        """
+        return x.tobytes() if hasattr(x, "tobytes") else tuple(x)
+
+
+class MemoizedCost(CostFunction):
+    """
+    LRU memoization for cost functions whose value only depends on x. With 'decimals', inputs are rounded to that
+    many decimals to build the key, so nearby inputs share their cost. InvslackCost already memoizes its evaluations
+    exactly, taking the system state into account, so it does not need this adapter
+    """
+    def __init__(self, cost_function: CostFunction, maxsize=4096, decimals=None):
+        self.cost_function = cost_function
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self._cache = OrderedDict()
+        self._lock = Lock()
+
+    def reset(self):
+        self.cost_function.reset()
+        with self._lock:
+            self._cache.clear()
+
+    def compute(self, S: LinearSystem, x: [float]) -> float:
+        key = tuple(x) if self.decimals is None else tuple(round(v, self.decimals) for v in x)
+        with self._lock:
+            cost = self._cache.get(key)
+            if cost is not None:
+                self._cache.move_to_end(key)
+                return cost
+
+        cost = self.cost_function.compute(S, x)
+        with self._lock:
+            self._cache[key] = cost
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return cost
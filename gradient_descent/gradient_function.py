@@ -1,49 +1,165 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
 from gradient_descent.interfaces import GradientFunction, CostFunction
 from model.analysis_function import Function
+from model.linear_system_utils import backup_assignment, restore_assignment, ASSIGNMENT_FIELDS
 from model.system_model import SystemModel
+from utils.jit import njit, prange
 
 
 class SequentialGradientFunction(GradientFunction):
-    def __init__(self, cost_function: CostFunction, sigma=1.5):
+    def __init__(self, cost_function: CostFunction, sigma=1.5, n_workers=None):
         self.delta_function = AvgSeparationDelta(sigma=sigma)
         self.cost_function = cost_function
+        self.n_workers = n_workers  # if greater than 1, number of threads that evaluate the costs
+        self._inputs = None         # buffer for the gradient inputs, reused across iterations
+        self._copies = None         # (system, copies of it for the threads), kept until reset
 
     def reset(self):
         self.delta_function.reset()
         self.cost_function.reset()
+        self._copies = None
 
     def compute(self, S: SystemModel, x: [float]) -> [float]:
         deltas = self.delta_function.apply(S, x)
-        inputs = gradient_inputs_from_deltas(x, deltas)
-        costs = [self.cost_function.compute(S, x) for x in inputs]
+        self._inputs = gradient_inputs_from_deltas(x, deltas, out=self._inputs)
+        inputs = self._inputs.tolist()
+        if self.n_workers and self.n_workers > 1:
+            costs = self._parallel_costs(S, inputs)
+        else:
+            costs = self.cost_function.compute_batch(S, inputs)
         gradient = gradient_from_costs(costs, deltas)
         return gradient
 
+    def _parallel_costs(self, S: SystemModel, inputs: [[float]]) -> [float]:
+        """
+        Evaluates the inputs in chunks, one per thread. Each thread works on its own copy of the system. The copies are
+        made the first time and reused until reset. The assignment of S changes between calls, and parameter handlers
+        may read it when inserting x (e.g. DeadlineExtractor scales by the maximum deadline), so it is written into the
+        copies before every batch
+        """
+        chunks = [inputs[i::self.n_workers] for i in range(self.n_workers)]
+        chunks = [chunk for chunk in chunks if chunk]
+        if self._copies is None or self._copies[0] is not S:
+            self._copies = (S, [copy.deepcopy(S) for _ in range(self.n_workers)])
+        systems = self._copies[1][:len(chunks)]
+        for system in systems:
+            _copy_assignment(S, system)
+        with ThreadPoolExecutor(len(chunks)) as executor:
+            results = list(executor.map(self.cost_function.compute_batch, systems, chunks))
+
+        # undo the interleaving of the chunks
+        costs = [None] * len(inputs)
+        for i, chunk_costs in enumerate(results):
+            costs[i::len(chunks)] = chunk_costs
+        return costs
+
+
+def _copy_assignment(S: SystemModel, target: SystemModel):
+    """Writes the assignment of S into target, a copy of S. Processors are matched by their position"""
+    priorities, deadlines, processors = backup_assignment(S, ASSIGNMENT_FIELDS)
+    index = {proc: i for i, proc in enumerate(S.processors)}
+    processors = tuple(None if p is None else target.processors[index[p]] for p in processors)
+    restore_assignment(target, (priorities, deadlines, processors), ASSIGNMENT_FIELDS)
+
+
+class ForwardDifferenceGradientFunction(GradientFunction):
+    """
+    Forward difference gradient, (f(x+delta*e_i) - f(x))/delta. Needs n+1 cost evaluations instead of the 2n of the
+    central difference, at the cost of a less accurate gradient. The cost of x is usually already known by the
+    optimizer: if the cost function memoizes its results (e.g. InvslackCost), it is not evaluated again
+    """
+    def __init__(self, cost_function: CostFunction, sigma=1.5):
+        self.delta_function = AvgSeparationDelta(sigma=sigma)
+        self.cost_function = cost_function
+
+    def reset(self):
+        self.delta_function.reset()
+        self.cost_function.reset()
+
+    def compute(self, S: SystemModel, x: [float]) -> [float]:
+        deltas = self.delta_function.apply(S, x)
+        if 0 in deltas:
+            raise ZeroDivisionError("gradient delta is zero")
+        n = len(x)
+        d = np.asarray(deltas, dtype=np.float64)
+        inputs = np.broadcast_to(np.asarray(x, dtype=np.float64), (n, n)).copy()
+        inputs[np.arange(n), np.arange(n)] += d
+        f0 = self.cost_function.compute(S, x)
+        costs = np.array(self.cost_function.compute_batch(S, inputs.tolist()))
+        return list((costs - f0) / d)
+
+
+class JitGradientFunction(GradientFunction):
+    """
+    Central difference gradient of a cost function compiled with Numba: a njit function that receives x as a float64
+    array and returns its cost. The 2n perturbed costs are evaluated in parallel, outside the interpreter. The
+    schedulability analyses work on Python objects and cannot be called from there, so for InvslackCost use
+    SequentialGradientFunction or VectorFPGradientFunction instead
+    """
+    def __init__(self, cost_fn, sigma=1.5):
+        self.delta_function = AvgSeparationDelta(sigma=sigma)
+        self.cost_fn = cost_fn
+
+    def compute(self, S: SystemModel, x: [float]) -> [float]:
+        deltas = self.delta_function.apply(S, x)
+        if 0 in deltas:
+            raise ZeroDivisionError("gradient delta is zero")
+        return _central_differences(np.asarray(x, dtype=np.float64), deltas, self.cost_fn).tolist()
+
+
+@njit(parallel=True)
+def _central_differences(x, deltas, cost_fn):
+    n = x.shape[0]
+    gradient = np.empty(n)
+    for i in prange(n):
+        xp = x.copy()
+        xp[i] += deltas[i]
+        xm = x.copy()
+        xm[i] -= deltas[i]
+        gradient[i] = (cost_fn(xp) - cost_fn(xm)) / (2 * deltas[i])
+    return gradient
+
 
 class AvgSeparationDelta(Function):
     def __init__(self, sigma=1.5):
         self.sigma = sigma
 
     def apply(self, S: SystemModel, x: [float]) -> [float]:
-        seps = [abs(x[i + 1] - x[i]) for i in range(len(x) - 1)]
-        return [self.sigma * sum(seps) / len(seps)]*len(x)
+        seps = np.abs(np.diff(np.asarray(x, dtype=np.float64)))
+        # builtin sum adds sequentially. np.mean would use pairwise summation, giving slightly different deltas
+        return np.full(len(x), self.sigma * sum(seps.tolist()) / len(seps))
 
 
-def gradient_inputs_from_deltas(x, deltas) -> [[float]]:
-    ret = []
-    for i in range(len(x)):
-        vector = x[:]
-        vector[i] += deltas[i]
-        ret.append(vector)
-        vector = x[:]
-        vector[i] -= deltas[i]
-        ret.append(vector)
-    return ret
+def gradient_inputs_from_deltas(x, deltas, out: np.ndarray = None) -> np.ndarray:
+    """
+    Returns a (2n, n) matrix with the inputs for a central difference gradient. Rows 2i and 2i+1 are x with
+    deltas[i] added to and subtracted from element i. If 'out' has the right shape, it is filled and returned instead
+    of allocating a new matrix
+    """
+    n = len(x)
+    idx = np.arange(n)
+    deltas = np.asarray(deltas, dtype=np.float64)
+    inputs = out if out is not None and out.shape == (2*n, n) else np.empty((2*n, n))
+    inputs[:] = np.asarray(x, dtype=np.float64)
+    inputs[2*idx, idx] += deltas[:n]
+    inputs[2*idx+1, idx] -= deltas[:n]
+    return inputs
 
 
 def gradient_from_costs(costs, deltas) -> [float]:
-    gradient = [0] * int(len(costs) / 2)
-    for i in range(len(gradient)):
-        gradient[i] = (costs[2*i] - costs[2*i + 1]) / \
-                      (2 * deltas[i % len(deltas)])
-    return gradient
\ No newline at end of file
+    """Central difference gradient. costs[2i] and costs[2i+1] are the costs of the inputs with +-deltas[i]"""
+    if 0 in deltas:
+        raise ZeroDivisionError("gradient delta is zero")
+    c = np.asarray(costs).reshape(-1, 2)
+    d = np.asarray(deltas, dtype=np.float64)
+    if np.all(d == d[0]):
+        # a python float keeps float32 costs (vector analysis) in float32, as the scalar computation did
+        gradient = (c[:, 0] - c[:, 1]) / (2 * float(d[0]))
+    else:
+        d = (2 * d).astype(c.dtype)
+        gradient = (c[:, 0] - c[:, 1]) / d[np.arange(len(c)) % len(d)]
+    return list(gradient)
@@ -1,3 +1,5 @@
+import numpy as np
+
 from gradient_descent.interfaces import ParameterHandler, CostFunction, StopFunction, GradientFunction, UpdateFunction
 from model.analysis_function import Function
 from model.system_model import SystemModel
@@ -29,7 +31,8 @@ class GradientDescentOptimizer(Function):
         self.stop_function.reset()
         self.gradient_function.reset()
         self.update_function.reset()
-        self.ref_cost_function.reset()
+        if self.ref_cost_function:
+            self.ref_cost_function.reset()
 
     def apply(self, S: SystemModel) -> [float]:
         t = 1
@@ -62,12 +65,11 @@ class GradientDescentOptimizer(Function):
 
             nabla = self.gradient_function.compute(S, x)
             update = self.update_function.update(S, x, nabla, t)
-            x = [a + b for a, b in zip(x, update)]
+            x = (np.asarray(x, dtype=np.float64) + update).tolist()
             t = t + 1
 
-            # insert into system, extract again to get x properly normalized
-            self.parameter_handler.insert(S, x)
-            x = self.parameter_handler.extract(S)
+            # get x properly normalized, as if it was inserted into the system and extracted again
+            x = self.parameter_handler.normalize(S, x)
 
         solution = self.stop_function.solution(S)
         self.parameter_handler.insert(S, solution)
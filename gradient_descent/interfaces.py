@@ -35,6 +35,39 @@ class ParameterHandler(Function):
         """
         pass
 
+    def normalize(self, system: SystemModel, x: list[float]) -> list[float]:
+        """
+        Returns the normalized version of the given parameters, as they
+        would be extracted from the system after inserting them.
+
+        By default, the parameters are inserted into the system and
+        extracted again. Subclasses whose normalization does not depend
+        on the system can override it to avoid that round trip.
+
+        Args:
+            system: The real-time system the parameters belong to.
+            x: A list of floats representing the parameters to normalize.
+
+        Returns:
+            A list of floats representing the normalized parameters.
+        """
+        self.insert(system, x)
+        return self.extract(system)
+
+    def affected_fields(self) -> tuple[str, ...]:
+        """
+        Returns the names of the task attributes that `insert` may modify.
+
+        Cost functions use it to back up and restore only those attributes
+        around each evaluation. By default, the whole assignment (priority,
+        deadline and processor) is assumed to be modified.
+
+        Returns:
+            A tuple with the names of the modified task attributes.
+        """
+        return "priority", "deadline", "processor"
+
+
 class CostFunction(Function):
     """
     Defines the cost function to be minimized by the optimization algorithm.
@@ -57,6 +90,23 @@ class CostFunction(Function):
         """
         pass
 
+    def compute_batch(self, system: SystemModel, xs: list[list[float]]) -> list[float]:
+        """
+        Computes the cost values for several sets of parameters.
+
+        By default, `compute` is called for each set of parameters.
+        Subclasses can override it to share work between evaluations.
+
+        Args:
+            system: The real-time system being optimized.
+            xs: A list of parameter lists to evaluate.
+
+        Returns:
+            A list with the cost value of each set of parameters.
+        """
+        return [self.compute(system, x) for x in xs]
+
+
 class StopFunction(Function):
     """
     Defines the criteria for stopping the optimization algorithm.
@@ -92,6 +142,7 @@ class StopFunction(Function):
         """Returns the cost value of the solution"""
         pass
 
+
 class GradientFunction(Function):
     """
     Calculates the gradient of the cost function.
@@ -114,6 +165,7 @@ class GradientFunction(Function):
         """
         pass
 
+
 class UpdateFunction(Function):
     """
     Defines the update rule for the optimization algorithm.
@@ -1,27 +1,41 @@
 from gradient_descent.interfaces import ParameterHandler
 from model.linear_system import LinearSystem
+import numpy as np
 import math
 
 
 class DeadlineExtractor(ParameterHandler):
     def extract(self, system: LinearSystem) -> [float]:
-        max_d = max([task.deadline for task in system.tasks])
-        x = [sigmoid(t.deadline/max_d) for t in system.tasks]
-        return x
+        deadlines = task_vector(system, "deadline")
+        return sigmoid_vector(deadlines / deadlines.max()).tolist()
 
     def insert(self, system: LinearSystem, x: [float]):
-        max_d = max([task.deadline for task in system.tasks])
+        self._insert(system, x)
+
+    def normalize(self, system: LinearSystem, x: [float]) -> [float]:
+        # same as inserting and extracting, but reusing the inserted deadlines instead of scanning the tasks again
+        deadlines = self._insert(system, x)
+        return sigmoid_vector(deadlines / deadlines.max()).tolist()
+
+    def affected_fields(self) -> tuple[str, ...]:
+        return "deadline",
+
+    @staticmethod
+    def _insert(system: LinearSystem, x: [float]) -> np.ndarray:
+        """Inserts the deadlines, scaled by the current maximum deadline, and returns them"""
         tasks = system.tasks
         assert len(tasks) == len(x)
-        for v, t in zip(x, tasks):
-            t.deadline = v*max_d
+        max_d = task_vector(system, "deadline").max()
+        deadlines = np.asarray(x, dtype=np.float64) * max_d
+        for d, t in zip(deadlines.tolist(), tasks):
+            t.deadline = d
+        return deadlines
 
 
 class PriorityExtractor(ParameterHandler):
     def extract(self, system: LinearSystem) -> [float]:
         # max_priority = max(map(lambda t: t.priority, system.tasks))
-        r = [sigmoid(t.priority) for t in system.tasks]
-        return r
+        return sigmoid_vector(task_vector(system, "priority")).tolist()
 
     def insert(self, system: LinearSystem, x: [float]):
         tasks = system.tasks
@@ -29,6 +43,13 @@ class PriorityExtractor(ParameterHandler):
         for v, t in zip(x, tasks):
             t.priority = v
 
+    def normalize(self, system: LinearSystem, x: [float]) -> [float]:
+        # extracting the priorities right after inserting them is just the sigmoid of x
+        return sigmoid_vector(np.asarray(x, dtype=np.float64)).tolist()
+
+    def affected_fields(self) -> tuple[str, ...]:
+        return "priority",
+
 
 class MappingPriorityExtractor(ParameterHandler):
     def __init__(self):
@@ -38,7 +59,7 @@ class MappingPriorityExtractor(ParameterHandler):
         self.prio_extractor.reset()
 
     def extract(self, S: LinearSystem) -> [float]:
-        m_vector = [0.55 if task.processor == proc else 0.45 for task in S.tasks for proc in S.processors]
+        m_vector = mapping_vector(S)
         p_vector = self.prio_extractor.extract(S)
         return m_vector + p_vector
 
@@ -50,14 +71,20 @@ class MappingPriorityExtractor(ParameterHandler):
         assert len(x) == p*t + t
 
         # parse mapping values (fist p*t values)
-        for i in range(t):
-            sub = x[i*p: i*p+3]
-            proc_index = sub.index(max(sub))
-            tasks[i].processor = procs[proc_index]
+        insert_mapping(S, x[:p*t])
 
         # parse priority values (last t values)
         self.prio_extractor.insert(S, x[-t:])
 
+    def normalize(self, S: LinearSystem, x: [float]) -> [float]:
+        t = len(S.tasks)
+        p = len(S.processors)
+        mapping = np.asarray(x[:p*t], dtype=np.float64).reshape(t, p).argmax(axis=1)
+        return mapping_scores(mapping, p) + self.prio_extractor.normalize(S, x[-t:])
+
+    def affected_fields(self) -> tuple[str, ...]:
+        return ("processor",) + self.prio_extractor.affected_fields()
+
 
 class MappingDeadlineExtractor(ParameterHandler):
     def __init__(self):
@@ -67,7 +94,7 @@ class MappingDeadlineExtractor(ParameterHandler):
         self.deadline_extractor.reset()
 
     def extract(self, S: LinearSystem) -> [float]:
-        m_vector = [0.55 if task.processor == proc else 0.45 for task in S.tasks for proc in S.processors]
+        m_vector = mapping_vector(S)
         t_vector = self.deadline_extractor.extract(S)
         return m_vector + t_vector
 
@@ -79,14 +106,46 @@ class MappingDeadlineExtractor(ParameterHandler):
         assert len(x) == p*t + t
 
         # parse mapping values (fist p*t values)
-        for i in range(t):
-            sub = x[i*p: i*p+3]
-            proc_index = sub.index(max(sub))
-            tasks[i].processor = procs[proc_index]
+        insert_mapping(S, x[:p*t])
 
         # parse priority values (last t values)
         self.deadline_extractor.insert(S, x[-t:])
 
+    def affected_fields(self) -> tuple[str, ...]:
+        return ("processor",) + self.deadline_extractor.affected_fields()
+
+
+def mapping_vector(S: LinearSystem) -> [float]:
+    """Flattened (tasks, processors) matrix with 0.55 in the processor of each task, and 0.45 elsewhere"""
+    procs = S.processors
+    mapping = np.array([procs.index(task.processor) for task in S.tasks], dtype=np.intp)
+    return mapping_scores(mapping, len(procs))
+
+
+def mapping_scores(mapping: np.ndarray, n_procs: int) -> [float]:
+    """Flattened mapping matrix for the given processor index of each task"""
+    return np.where(mapping[:, None] == np.arange(n_procs)[None, :], 0.55, 0.45).ravel().tolist()
+
+
+def insert_mapping(S: LinearSystem, m_vector: [float]) -> None:
+    """Assigns each task to the processor with the highest value in its row of the flattened mapping matrix"""
+    tasks = S.tasks
+    procs = S.processors
+    indexes = np.asarray(m_vector, dtype=np.float64).reshape(len(tasks), len(procs)).argmax(axis=1)
+    for task, i in zip(tasks, indexes.tolist()):
+        task.processor = procs[i]
+
 
 def sigmoid(x):
-    return 1 / (1 + math.exp(-x))
\ No newline at end of file
+    return 1 / (1 + math.exp(-x))
+
+
+def sigmoid_vector(x: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):  # exp overflows to inf for very negative x, so the sigmoid is 0
+        return 1 / (1 + np.exp(-x))
+
+
+def task_vector(system: LinearSystem, attr: str) -> np.ndarray:
+    """Values of the given task attribute, in system.tasks order"""
+    tasks = system.tasks
+    return np.fromiter((getattr(t, attr) for t in tasks), dtype=np.float64, count=len(tasks))
\ No newline at end of file
@@ -1,26 +1,33 @@
+import numpy as np
+
 from gradient_descent.interfaces import StopFunction
 from model.system_model import SystemModel
 
 
 class ThresholdStopFunction(StopFunction):
-    def __init__(self, limit=100, threshold=0):
+    def __init__(self, limit=100, threshold=0, patience=None):
         self.limit = limit
         self.threshold = threshold
+        self.patience = patience  # optional: stop after this many iterations without improving the best cost
         self.best = float("inf")  # best cost value
         self.xb = None            # best solution
+        self.tb = 0               # iteration of the best solution
 
     def reset(self):
         self.best = float("inf")
         self.xb = None
+        self.tb = 0
 
     def should_stop(self, S: SystemModel, x: [float], cost: float, t: int) -> bool:
         if cost < self.best:
             self.best = cost
-            self.xb = x
-        return cost < self.threshold or t > self.limit
+            self.xb = np.array(x, dtype=np.float64)  # copy, x may be a buffer reused by the caller
+            self.tb = t
+        stalled = self.patience is not None and t - self.tb >= self.patience
+        return cost < self.threshold or t > self.limit or stalled
 
     def solution(self, S: SystemModel):
-        return self.xb
+        return self.xb.tolist() if self.xb is not None else None
 
     def solution_cost(self):
         return self.best
@@ -39,11 +46,11 @@ class FixedIterationsStop(StopFunction):
     def should_stop(self, S: SystemModel, x: [float], cost: float, t: int) -> bool:
         if cost < self.best:
             self.best = cost
-            self.xb = x
+            self.xb = np.array(x, dtype=np.float64)  # copy, x may be a buffer reused by the caller
         return t > self.iterations
 
     def solution(self, S: SystemModel):
-        return self.xb
+        return self.xb.tolist() if self.xb is not None else None
 
     def solution_cost(self):
         return self.best
\ No newline at end of file
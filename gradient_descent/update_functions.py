@@ -1,5 +1,6 @@
 from gradient_descent.interfaces import UpdateFunction
 from model.system_model import SystemModel
+from utils.jit import njit
 import numpy as np
 import math
 
@@ -23,16 +24,16 @@ class GradientNoise(UpdateFunction):
         # for smaller systems, this reduction seems to not affect negatively
         std = self.lr / (1 + t + len(nabla)) ** self.gamma
         noise = self.rng.normal(0, std, len(nabla))
-        for j in range(len(nabla)):
-            nabla[j] += noise[j]
-        return nabla
+        return np.asarray(nabla, dtype=np.float64) + noise
 
 
 class Adam(UpdateFunction):
-    def __init__(self, lr=3, beta1=0.9, beta2=0.999, epsilon=0.1):
+    def __init__(self, lr=3, beta1=0.9, beta2=0.999, epsilon=0.1, dtype=np.float64):
+        self.dtype = dtype      # precision of the moments and updates
         self.size = None
         self.m = None
         self.v = None
+        self.updates = None
         self.lr = lr
         self.beta1 = beta1
         self.beta2 = beta2
@@ -40,33 +41,31 @@ class Adam(UpdateFunction):
         self.reset()
 
     def reset(self):
-        self.size = None
-        self.m = None
-        self.v = None
+        # moment buffers are kept and zeroed in place, so an instance reused across systems does not reallocate them
+        if self.m is not None:
+            self.m.fill(0.)
+            self.v.fill(0.)
 
     def update(self, S: SystemModel, x: [float], nabla: [float], t: int) -> [float]:
-        if not self.size:
+        if self.size != len(nabla):
             self.size = len(nabla)
-            self.m = [0]*self.size
-            self.v = [0]*self.size
-
-        updates = [0]*self.size
-        for i in range(self.size):
-            self.m[i] = self.beta1 * self.m[i] + (1 + self.beta1) * nabla[i]
-            self.v[i] = self.beta2 * self.v[i] + (1 + self.beta2) * nabla[i] ** 2
-
-            me = self.m[i] / (1 - self.beta1 ** t)
-            ve = self.v[i] / (1 - self.beta2 ** t)
+            self.m = np.zeros(self.size, dtype=self.dtype)
+            self.v = np.zeros(self.size, dtype=self.dtype)
+            self.updates = np.empty(self.size, dtype=self.dtype)
 
-            updates[i] = -self.lr*me/(math.sqrt(ve)+self.epsilon)
-
-        return updates
+        # bias corrections are computed once per update, outside the kernel loop. beta**t is used instead of
+        # accumulating beta*beta*... across updates: the product drifts in the last bits and changes the trajectory.
+        # The returned vector is a buffer owned by this instance, overwritten by the next update
+        nabla = np.asarray(nabla, dtype=self.dtype)
+        _adam_step(self.m, self.v, nabla, self.beta1, self.beta2, 1 - self.beta1 ** t, 1 - self.beta2 ** t,
+                   self.lr, self.epsilon, self.updates)
+        return self.updates
 
 
 class NoisyAdam(UpdateFunction):
-    def __init__(self, lr=3, beta1=0.9, beta2=0.999, epsilon=0.1, gamma=0.9, seed=1):
+    def __init__(self, lr=3, beta1=0.9, beta2=0.999, epsilon=0.1, gamma=0.9, seed=1, dtype=np.float64):
         self.noise = GradientNoise(lr=lr, gamma=gamma, seed=seed)
-        self.adam = Adam(lr=lr, beta1=beta1, beta2=beta2, epsilon=epsilon)
+        self.adam = Adam(lr=lr, beta1=beta1, beta2=beta2, epsilon=epsilon, dtype=dtype)
 
     def reset(self):
         self.noise.reset()
@@ -76,3 +75,19 @@ class NoisyAdam(UpdateFunction):
         noisy_gradient = self.noise.update(S, x, nabla, t)
         update = self.adam.update(S, x, noisy_gradient, t)
         return update
+
+
+@njit(cache=True)
+def _adam_step(m, v, nabla, beta1, beta2, bias1, bias2, lr, epsilon, updates):
+    """
+    Updates the moments m and v in place, and writes the update vector into 'updates'. bias1 and bias2 are the bias
+    corrections for the current iteration, (1-beta1^t) and (1-beta2^t)
+    """
+    for i in range(m.size):
+        m[i] = beta1 * m[i] + (1 + beta1) * nabla[i]
+        v[i] = beta2 * v[i] + (1 + beta2) * (nabla[i] * nabla[i])
+
+        me = m[i] / bias1
+        ve = v[i] / bias2
+
+        updates[i] = -lr*me/(math.sqrt(ve)+epsilon)
@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
+from bisect import bisect_right
 
-from model.linear_system import LinearSystem, Task
+import numpy as np
+
+from model.linear_system import LinearSystem, Task, Processor
 
 
 class Function(ABC):
@@ -21,8 +24,25 @@ class AnalysisFunction(Function):
 
 
 def higher_priority(task: Task) -> list[Task]:
-    return [t for t in task.processor.tasks
-            if t.priority >= task.priority and t != task]
+    tasks, order, keys = _sorted_by_priority(task.processor)
+    # tasks with priority >= task.priority are a prefix of the sorted order. They are returned in processor order,
+    # the analyses accumulate their interferences in that order
+    cutoff = bisect_right(keys, -task.priority)
+    return [tasks[i] for i in sorted(order[:cutoff]) if tasks[i] is not task]
+
+
+def _sorted_by_priority(processor: Processor):
+    """
+    Tasks of the processor, the positions of those tasks sorted by decreasing priority, and the negated priorities in
+    that order. Rebuilt only after a task of the processor changes its priority or mapping
+    """
+    if processor._sorted_by_prio_dirty or processor._sorted_by_prio is None:
+        tasks = processor.tasks
+        order = sorted(range(len(tasks)), key=lambda i: -tasks[i].priority)
+        keys = [-tasks[i].priority for i in order]
+        processor._sorted_by_prio = (tasks, order, keys)
+        processor._sorted_by_prio_dirty = False
+    return processor._sorted_by_prio
 
 
 def init_wcrt(system: LinearSystem):
@@ -39,28 +59,50 @@ def reset_wcrt(system: LinearSystem):
         task.wcrt = None
 
 
+def processor_vectors(system: LinearSystem) -> dict:
+    """Tasks of each processor, with their periods, wcets and deadlines as vectors. They do not change during an
+    analysis, so they are built once. Jitters do change, and are read by interfering_vectors"""
+    vectors = {}
+    for proc in system.processors:
+        tasks = proc.tasks
+        vectors[proc] = (tasks,
+                         np.array([t.period for t in tasks], dtype=np.float64),
+                         np.array([t.wcet for t in tasks], dtype=np.float64),
+                         np.array([t.deadline for t in tasks], dtype=np.float64))
+    return vectors
+
+
+def interfering_vectors(task: Task, vectors: dict):
+    """Jitters, periods, wcets and deadlines of the other tasks in the processor of 'task', as vectors. 'vectors' are
+    built by processor_vectors"""
+    tasks, periods, wcets, deadlines = vectors[task.processor]
+    i = tasks.index(task)
+    jitters = np.array([t.jitter for t in tasks if t is not task], dtype=np.float64)
+    return jitters, np.delete(periods, i), np.delete(wcets, i), np.delete(deadlines, i)
+
+
 def repr_wcrts(system: LinearSystem) -> str:
-    msg = ""
+    lines = []
     for flow in system.flows:
         ts = " ".join(map(lambda t: f"{t.wcrt if t.wcrt else -1:.2f}", flow.tasks))
-        msg += f"{flow.period}: {ts} : {flow.deadline}\n"
-    return msg
+        lines.append(f"{flow.period}: {ts} : {flow.deadline}\n")
+    return "".join(lines)
 
 
 def debug_repr(system: LinearSystem):
-    msg = ""
-    for i, task in enumerate(system.tasks):
-        msg += f"task {i} [proc={task.processor.name} prio={task.priority:.3f} C={task.wcet:.3f} T={task.flow.period:.3f} J={task.jitter:.3f}]\n"
-    return msg
+    return "".join(f"task {i} [proc={task.processor.name} prio={task.priority:.3f} C={task.wcet:.3f} "
+                   f"T={task.flow.period:.3f} J={task.jitter:.3f}]\n"
+                   for i, task in enumerate(system.tasks))
 
 
 def calculate_priorities(system) -> bool:
     changed = False
     for processor in system.processors:
-        tasks = sorted(processor.tasks,
-                       key=lambda t: t.deadline,
-                       reverse=True)
-        for i, task in enumerate(tasks):
+        tasks = processor.tasks
+        deadlines = np.fromiter((t.deadline for t in tasks), dtype=np.float64, count=len(tasks))
+        order = np.argsort(-deadlines, kind="stable")  # decreasing deadlines, ties keep the processor order
+        for i, index in enumerate(order.tolist()):
+            task = tasks[index]
             if not changed and task.priority != i + 1:
                 changed = True
             task.priority = i + 1
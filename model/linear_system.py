@@ -1,11 +1,17 @@
 import math
+import numbers
 import sys
 import warnings
 from enum import Enum
-from typing import List, Union, Callable
+from functools import reduce
+from operator import attrgetter
+from typing import List, Union, Callable, Dict
 
 from model.system_model import SystemModel
 
+# non-integer periods are rounded to multiples of 1/HYPERPERIOD_SCALE to compute the hyperperiod
+HYPERPERIOD_SCALE = 1000
+
 
 class LinearSystem(SystemModel):
     """
@@ -16,11 +22,18 @@ class LinearSystem(SystemModel):
     provide specific details about the system's tasks, processors,
     scheduling policy, and other relevant characteristics.
     """
+    __slots__ = ("name", "flows", "processors", "_tasks", "_hyperperiod", "_flow_by_name", "_sched_counts",
+                 "__weakref__")
+
     def __init__(self):
         """Initializes an system with a name, flows, and processors."""
         self.name = None
         self.flows: List[Flow] = []
         self.processors: List[Processor] = []
+        self._tasks: Union[List[Task], None] = None  # cached flat list of tasks, rebuilt after adding flows or tasks
+        self._hyperperiod = None  # (periods, hyperperiod) of the last computation
+        self._flow_by_name: Dict[str, Flow] = {}
+        self._sched_counts: Dict[SchedulerType, int] = {}  # number of processors of each scheduler type
 
     def add_flows(self, *flows: "Flow") -> None:
         """
@@ -30,8 +43,11 @@ class LinearSystem(SystemModel):
             *flows: Variable number of Flow objects to be added.
         """
         self.flows += flows
+        self._tasks = None
         for flow in flows:
             flow.system = self
+            _index_by_name(self._flow_by_name, flow)
+            _mark_processors_dirty(flow.tasks)
 
     def add_procs(self, *procs: "Processor") -> None:
         """
@@ -43,6 +59,8 @@ class LinearSystem(SystemModel):
         for proc in procs:
             self.processors.append(proc)
             proc.system = self
+            self._sched_counts[proc.sched] = self._sched_counts.get(proc.sched, 0) + 1
+            proc._invalidate_tasks()
 
     def __getitem__(self, item: Union[int, str, slice]) -> Union["Flow", List["Flow"], None]:
         """
@@ -58,8 +76,7 @@ class LinearSystem(SystemModel):
         if isinstance(item, int) or isinstance(item, slice):
             return self.flows[item]
         elif isinstance(item, str):
-            match = [flow for flow in self.flows if flow.name == item]
-            return match[0] if match else None
+            return self._flow_by_name.get(item)
         return None
 
     def apply(self, function: Callable) -> "LinearSystem":
@@ -77,8 +94,15 @@ class LinearSystem(SystemModel):
 
     @property
     def tasks(self) -> List["Task"]:
-        """Returns a list of all tasks in the system."""
-        return [task for flow in self.flows for task in flow.tasks]
+        """
+        Returns a list of all tasks in the system, flow by flow.
+
+        The list is cached and shared between calls, so it must not be
+        modified. Copy it first if needed.
+        """
+        if self._tasks is None:
+            self._tasks = [task for flow in self.flows for task in flow.tasks]
+        return self._tasks
 
     def processor(self, name: str) -> Union["Processor", None]:
         """
@@ -94,35 +118,51 @@ class LinearSystem(SystemModel):
 
     def is_schedulable(self) -> bool:
         """Returns True if all flows in the system are schedulable, False otherwise."""
-        return all(flow.is_schedulable() for flow in self.flows)
+        # same check as Flow.is_schedulable, inlined: this runs after every analysis of the evaluation loops
+        for flow in self.flows:
+            tasks = flow.tasks
+            wcrt = tasks[-1].wcrt if tasks else None
+            if wcrt is None or not wcrt <= flow.deadline:
+                return False
+        return True
 
     @property
     def utilization(self) -> float:
         """Returns the average utilization across all processors in the system."""
-        utilizations = [proc.utilization for proc in self.processors]
-        return sum(utilizations) / len(utilizations) if utilizations else 0
+        procs = self.processors
+        return sum(map(attrgetter("utilization"), procs)) / len(procs) if procs else 0
 
     @property
     def max_utilization(self) -> float:
         """Returns the maximum utilization among all processors in the system."""
-        utilizations = [proc.utilization for proc in self.processors]
-        return max(utilizations) if utilizations else 0
+        return max(map(attrgetter("utilization"), self.processors), default=0)
 
     @property
     def slack(self) -> float:
         """Returns the minimum slack among all flows in the system."""
-        slacks = [flow.slack for flow in self.flows]
-        return min(slacks) if slacks else sys.float_info.min
+        return min(map(attrgetter("slack"), self.flows), default=sys.float_info.min)
 
     @property
     def avg_flow_wcrt(self) -> float:
         """Returns the average worst-case response time across all flows in the system."""
-        wcrts = [flow.wcrt for flow in self.flows]
-        return sum(wcrts) / len(wcrts) if wcrts else 0
+        flows = self.flows
+        return sum(map(attrgetter("wcrt"), flows)) / len(flows) if flows else 0
 
     @property
     def hyperperiod(self):
-        return math.lcm(*[f.period for f in self.flows])
+        """
+        Returns the least common multiple of the flow periods. Non-integer
+        periods are rounded to multiples of 1/HYPERPERIOD_SCALE first. The
+        result is reused until a period changes.
+        """
+        periods = tuple(f.period for f in self.flows)
+        if self._hyperperiod is None or self._hyperperiod[0] != periods:
+            if all(isinstance(p, numbers.Integral) for p in periods):
+                hyperperiod = reduce(math.lcm, map(int, periods), 1)
+            else:
+                hyperperiod = reduce(math.lcm, (round(p * HYPERPERIOD_SCALE) for p in periods), 1) / HYPERPERIOD_SCALE
+            self._hyperperiod = (periods, hyperperiod)
+        return self._hyperperiod[1]
 
     def __repr__(self) -> str:
         """Returns a string representation of the system, listing its flows."""
@@ -145,6 +185,9 @@ class Processor:
         sched: The scheduling policy used by the processor (FP or EDF).
         local: True if the processor uses local clock synchronization (for EDF-L).
     """
+    __slots__ = ("name", "_sched", "local", "system", "_tasks", "_sorted_by_prio", "_sorted_by_prio_dirty",
+                 "__weakref__")
+
     def __init__(self, name: str, sched: SchedulerType = SchedulerType.FP, local: bool = True):
         """
         Initializes a Processor with a name, scheduling policy, and locality flag.
@@ -155,25 +198,51 @@ class Processor:
             local: True for local clock synchronization (EDF-L). Defaults to True.
         """
         self.name: str = name
-        self.sched: SchedulerType = sched
-        self.local: bool = local
         self.system: LinearSystem = None
+        self._sched: SchedulerType = sched
+        self.local: bool = local
+        self._sorted_by_prio = None        # see model.analysis_function.higher_priority
+        self._sorted_by_prio_dirty = True  # set when any task of the processor changes its priority or mapping
+        self._tasks: Union[List[Task], None] = None  # cached tasks of the processor, rebuilt after mapping changes
 
     def __repr__(self) -> str:
         """Returns a string representation of the processor (its name)."""
         return f"{self.name}"
 
+    @property
+    def sched(self) -> SchedulerType:
+        """The scheduling policy used by the processor."""
+        return self._sched
+
+    @sched.setter
+    def sched(self, sched: SchedulerType) -> None:
+        if self.system:
+            counts = self.system._sched_counts
+            counts[self._sched] -= 1
+            counts[sched] = counts.get(sched, 0) + 1
+        self._sched = sched
+
     @property
     def tasks(self) -> List["Task"]:
-        """Returns a list of tasks assigned to this processor."""
-        return [task for flow in self.system.flows for task in flow.tasks
-                if task.processor == self] if self.system else []
+        """
+        Returns a list of tasks assigned to this processor, in system order.
+
+        The list is cached and shared between calls, so it must not be
+        modified.
+        """
+        if self._tasks is None:
+            self._tasks = [task for task in self.system.tasks if task.processor == self] if self.system else []
+        return self._tasks
+
+    def _invalidate_tasks(self) -> None:
+        """Called when a task is mapped to or out of this processor, or the tasks of the system change"""
+        self._tasks = None
+        self._sorted_by_prio_dirty = True
 
     @property
     def utilization(self) -> float:
         """Returns the total utilization of this processor."""
-        utilizations = [task.wcet / task.period for task in self.tasks]
-        return sum(utilizations)
+        return sum(task.wcet / task.flow.period for task in self.tasks)
 
 
 class Flow:
@@ -189,6 +258,9 @@ class Flow:
         phase: The phase of the flow (for simulation).
         priority: An optional priority level for the flow (used in some scheduling policies).
     """
+    __slots__ = ("system", "name", "period", "deadline", "tasks", "phase", "priority", "_task_by_name",
+                 "__weakref__")
+
     def __init__(self, name: str, period: float, deadline: float, priority: int = None):
         """
         Initializes a Flow with a name, period, and deadline.
@@ -206,6 +278,7 @@ class Flow:
         self.tasks: List[Task] = []
         self.phase: float = 0
         self.priority: int = priority  # Added priority attribute
+        self._task_by_name: Dict[str, Task] = {}
 
     def add_tasks(self, *tasks: "Task") -> None:
         """
@@ -214,9 +287,14 @@ class Flow:
         Args:
             *tasks: Variable number of Task objects to be added.
         """
-        self.tasks += tasks
         for task in tasks:
+            task.idx = len(self.tasks)
+            self.tasks.append(task)
             task.flow = self
+            _index_by_name(self._task_by_name, task)
+        if self.system:
+            self.system._tasks = None
+        _mark_processors_dirty(tasks)
 
     def __repr__(self) -> str:
         """Returns a string representation of the flow, listing its tasks."""
@@ -231,8 +309,9 @@ class Flow:
     @property
     def slack(self) -> float:
         """Returns the slack of the flow."""
-        if self.wcrt:
-            return (self.deadline - self.wcrt) / self.deadline
+        wcrt = self.tasks[-1].wcrt if self.tasks else None
+        if wcrt:
+            return (self.deadline - wcrt) / self.deadline
         return float("-inf")
 
     def predecessors(self, task: "Task") -> List["Task"]:
@@ -245,11 +324,8 @@ class Flow:
         Returns:
             A list of Task objects that are predecessors to the given task.
         """
-        try:
-            i = self.tasks.index(task)
-            return [self.tasks[i-1]] if i > 0 else []
-        except ValueError:
-            raise ValueError(f"Task {task} not found in flow {self.name}")
+        i = self._position(task)
+        return [self.tasks[i-1]] if i > 0 else []
 
     def successors(self, task: "Task") -> List["Task"]:
         """
@@ -261,11 +337,8 @@ class Flow:
         Returns:
             A list of Task objects that are successors to the given task.
         """
-        try:
-            i = self.tasks.index(task)
-            return [self.tasks[i + 1]] if i < len(self.tasks) - 1 else []
-        except ValueError:
-            raise ValueError(f"Task {task} not found in flow {self.name}")
+        i = self._position(task)
+        return [self.tasks[i + 1]] if i < len(self.tasks) - 1 else []
 
     def all_successors(self, task: "Task") -> List["Task"]:
         """
@@ -277,15 +350,20 @@ class Flow:
         Returns:
             A list of Task objects that are successors to the given task.
         """
-        try:
-            i = self.tasks.index(task)
-            return self.tasks[i+1:]
-        except ValueError:
+        i = self._position(task)
+        return self.tasks[i+1:]
+
+    def _position(self, task: "Task") -> int:
+        """Returns the position of the task in the flow, raising ValueError if it is not in the flow"""
+        i = task.idx
+        if i is None or i >= len(self.tasks) or self.tasks[i] is not task:
             raise ValueError(f"Task {task} not found in flow {self.name}")
+        return i
 
     def is_schedulable(self) -> bool:
         """Returns True if the flow is schedulable (wcrt <= deadline), False otherwise."""
-        return self.wcrt is not None and self.wcrt <= self.deadline
+        wcrt = self.tasks[-1].wcrt if self.tasks else None
+        return wcrt is not None and wcrt <= self.deadline
 
     def __getitem__(self, item: Union[int, str, slice]) -> Union["Task", List["Task"], None]:
         """
@@ -301,8 +379,7 @@ class Flow:
         if isinstance(item, int) or isinstance(item, slice):
             return self.tasks[item]
         elif isinstance(item, str):
-            match = [task for task in self.tasks if task.name == item]
-            return match[0] if match else None
+            return self._task_by_name.get(item)
         return None
 
 class TaskType(Enum):
@@ -325,7 +402,11 @@ class Task:
         deadline: The relative deadline of the task.
         wcrt: The worst-case response time of the task.
         bcet: The best-case execution time of the task.
+        idx: The position of the task in its flow.
     """
+    __slots__ = ("name", "wcet", "_processor", "type", "_priority", "deadline", "bcet", "wcrt", "flow", "idx",
+                 "__weakref__")
+
     def __init__(self,
                  name: str,
                  wcet: float,
@@ -348,6 +429,7 @@ class Task:
         """
         self.name: str = name
         self.wcet: float = wcet
+        self._processor: Processor = None
         self.processor: Processor = processor
         self.type: TaskType = type
         self.priority: int = priority
@@ -355,11 +437,36 @@ class Task:
         self.bcet: float = bcet
         self.wcrt: float = None
         self.flow: Flow = None
+        self.idx: int = None
 
     def __repr__(self) -> str:
         """Returns a string representation of the task."""
         return f"{self.processor.name if self.processor else None}({self.utilization:.2f})"
 
+    @property
+    def processor(self) -> Processor:
+        """The processor the task is assigned to."""
+        return self._processor
+
+    @processor.setter
+    def processor(self, processor: Processor) -> None:
+        if self._processor is not None:
+            self._processor._invalidate_tasks()
+        if processor is not None:
+            processor._invalidate_tasks()
+        self._processor = processor
+
+    @property
+    def priority(self) -> float:
+        """The priority of the task."""
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority: float) -> None:
+        if self._processor is not None:
+            self._processor._sorted_by_prio_dirty = True
+        self._priority = priority
+
     @property
     def utilization(self) -> float:
         """Returns the utilization of the task."""
@@ -397,17 +504,64 @@ class Task:
 
     @property
     def jitter(self) -> float:
-        """Returns the jitter of the task."""
-        wcrts = [t.wcrt for t in self.predecessors]
-        return max(wcrts) if wcrts else 0
+        """Returns the jitter of the task (the wcrt of its predecessor)."""
+        if not self.flow:
+            return 0
+        i = self.idx
+        return self.flow.tasks[i - 1].wcrt if i > 0 else 0
 
     def copy(self) -> "Task":
         """Returns a copy of the task."""
-        new_task = Task(name=self.name, wcet=self.wcet, processor=self.processor,
-                        priority=self.priority, type=self.type, bcet=self.bcet,
-                        deadline=self.deadline)
-        new_task.wcrt = self.wcrt
-        return new_task
+        return Task.bulk_clone([self])[0]
+
+    @classmethod
+    def bulk_clone(cls, tasks: List["Task"]) -> List["Task"]:
+        """
+        Returns copies of the given tasks, not attached to any flow.
+
+        The copies are allocated without running __init__ or the property
+        setters, so cloning many tasks only pays for the slot writes. The
+        processors are not notified: their task lists only change when the
+        copies are added to a flow of their system.
+
+        Args:
+            tasks: The tasks to copy.
+
+        Returns:
+            A list with a copy of each task, in the same order.
+        """
+        new = object.__new__
+        clones = []
+        for task in tasks:
+            clone = new(cls)
+            clone.name = task.name
+            clone.wcet = task.wcet
+            clone._processor = task._processor
+            clone.type = task.type
+            clone._priority = task._priority
+            clone.deadline = task.deadline
+            clone.bcet = task.bcet
+            clone.wcrt = task.wcrt
+            clone.flow = None
+            clone.idx = None
+            clones.append(clone)
+        return clones
+
+
+def _index_by_name(index: dict, element) -> None:
+    """Adds the element to a name index. With repeated names, lookups keep returning the first element"""
+    if element.name in index:
+        warnings.warn(f"Warning, duplicated name {element.name}, lookups by name return the first one")
+    else:
+        index[element.name] = element
+
+
+def _mark_processors_dirty(tasks) -> None:
+    """Invalidates the cached task lists of the processors of the given tasks"""
+    for task in tasks:
+        if task.processor is not None:
+            task.processor._invalidate_tasks()
+
 
 def is_scheduler_type(system: LinearSystem, sched_type: SchedulerType) -> bool:
     """
@@ -420,21 +574,34 @@ def is_scheduler_type(system: LinearSystem, sched_type: SchedulerType) -> bool:
     Returns:
         True if all processors use the specified type, False otherwise.
     """
-    return all(proc.sched == sched_type for proc in system.processors)
+    return system._sched_counts.get(sched_type, 0) == len(system.processors)
+
+
+_MISSING = object()  # marks attributes that could not be saved
 
-def save_attrs(elements: [], attrs: [str], key="_saved_") -> None:
+
+def save_attrs(elements: [], attrs: [str]) -> dict:
+    """
+    Returns a snapshot with the values of the given attributes of each element, to be restored with restore_attrs
+    """
+    snapshot = {}
     for element in elements:
+        values = []
         for attr in attrs:
-            if hasattr(element, attr):
-                value = getattr(element, attr)
-                setattr(element, key + attr, value)
-            else:
+            value = getattr(element, attr, _MISSING)
+            if value is _MISSING:
                 warnings.warn(f"Warning, element {element} does not have attribute {attr}")
+            values.append(value)
+        snapshot[element] = tuple(values)
+    return snapshot
 
 
-def restore_attrs(elements: [], attrs: [str], key="_saved_") -> None:
+def restore_attrs(elements: [], attrs: [str], snapshot: dict) -> None:
+    """Restores the attribute values saved in the snapshot returned by save_attrs"""
     for element in elements:
-        for attr in attrs:
-            if hasattr(element, key + attr):
-                value = getattr(element, key + attr)
+        values = snapshot.get(element)
+        if values is None:
+            continue
+        for attr, value in zip(attrs, values):
+            if value is not _MISSING:
                 setattr(element, attr, value)
@@ -1,14 +1,24 @@
+from operator import attrgetter
+
 from model.linear_system import LinearSystem
 
+ASSIGNMENT_FIELDS = ("priority", "deadline", "processor")
+
 
-def backup_assignment(system: LinearSystem):
+def backup_assignment(system: LinearSystem, fields=ASSIGNMENT_FIELDS):
+    """
+    Returns the given fields of every task, as one tuple of values per field (in system.tasks order). The backup is
+    hashable, and values keep their original types (e.g. int priorities or None deadlines)
+    """
     tasks = system.tasks
-    return [(t.priority, t.deadline, t.processor) for t in tasks]
+    return tuple(tuple(map(attrgetter(field), tasks)) for field in fields)
 
 
-def restore_assignment(system: LinearSystem, assignment):
+def restore_assignment(system: LinearSystem, assignment, fields=ASSIGNMENT_FIELDS):
+    """Restores a backup made with backup_assignment. Only the values that changed since the backup are written"""
     tasks = system.tasks
-    for (prio, deadline, processor), task in zip(assignment, tasks):
-        task.priority = prio
-        task.deadline = deadline
-        task.processor = processor
\ No newline at end of file
+    for field, values in zip(fields, assignment):
+        get = attrgetter(field)
+        for task, value in zip(tasks, values):
+            if get(task) is not value:
+                setattr(task, field, value)
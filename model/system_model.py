@@ -9,4 +9,4 @@ class SystemModel(ABC):
     provide specific details about the system's tasks, processors,
     scheduling policy, and other relevant characteristics.
     """
-    pass
+    __slots__ = ()
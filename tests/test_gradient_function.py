@@ -0,0 +1,60 @@
+import unittest
+from random import Random
+
+from analysis.holistic_local_edf_analysis import HolisticLocalEDFAnalysis
+from assignment.assignments import PDAssignment
+from examples.example_models import get_system
+from examples.generator import to_edf
+from gradient_descent.cost_functions import InvslackCost
+from gradient_descent.gradient_function import SequentialGradientFunction, JitGradientFunction
+from gradient_descent.gradient_optimizer import GradientDescentOptimizer
+from gradient_descent.parameter_handlers import DeadlineExtractor
+from gradient_descent.stop_functions import FixedIterationsStop
+from gradient_descent.update_functions import NoisyAdam
+from utils.jit import njit
+
+
+class SequentialGradientTest(unittest.TestCase):
+    def test_threads(self):
+        # DeadlineExtractor reads the deadlines of the system when inserting x, so the copies of the threads must follow
+        # the changes of the system across iterations
+        random = Random(2)
+        for i in range(2):
+            system = to_edf(get_system((2, 3, 2), random, utilization=0.7, balanced=i % 2 == 0, name=str(i)))
+            costs = []
+            for n_workers in (None, 4):
+                trajectory = []
+                optimizer = _optimizer(n_workers, callback=lambda t, S, x, xb, cost, best, ref: trajectory.append(cost))
+                optimizer.apply(PDAssignment().apply(system))
+                costs.append(trajectory)
+            self.assertEqual(costs[0], costs[1])
+
+
+class JitGradientTest(unittest.TestCase):
+    def test_squares(self):
+        x = [0.1, 0.5, -0.3, 0.8]
+        gradient = JitGradientFunction(_squares).compute(None, x)
+        for g, xi in zip(gradient, x):
+            self.assertIs(type(g), float)
+            self.assertAlmostEqual(g, 2 * xi, delta=1e-9)  # exact for a quadratic, up to rounding
+
+
+@njit
+def _squares(x):
+    return (x ** 2).sum()
+
+
+def _optimizer(n_workers, callback) -> GradientDescentOptimizer:
+    parameter_handler = DeadlineExtractor()
+    cost_function = InvslackCost(parameter_handler=parameter_handler,
+                                 analysis=HolisticLocalEDFAnalysis(limit_factor=10, reset=False))
+    return GradientDescentOptimizer(parameter_handler=parameter_handler,
+                                    cost_function=cost_function,
+                                    stop_function=FixedIterationsStop(iterations=5),
+                                    gradient_function=SequentialGradientFunction(cost_function, n_workers=n_workers),
+                                    update_function=NoisyAdam(seed=1),
+                                    callback=callback)
+
+
+if __name__ == '__main__':
+    unittest.main()
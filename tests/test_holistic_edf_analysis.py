@@ -0,0 +1,64 @@
+import unittest
+from random import Random
+
+from analysis.holistic_global_edf_analysis import HolisticGlobalEDFAnalysis
+from analysis.holistic_local_edf_analysis import HolisticLocalEDFAnalysis
+from assignment.assignments import PDAssignment
+from examples.example_models import get_system
+from examples.generator import to_edf
+
+
+class HolisticEDFTest(unittest.TestCase):
+    # response times of the original implementation. They must match to the last bit: a rounding difference in the
+    # interferences can move a ceil or floor, and with it the fixed point
+
+    def test_local(self):
+        system = _system((4, 5, 3), 0.6, seed=1260, k=1, local=True)
+        HolisticLocalEDFAnalysis(limit_factor=10, reset=True).apply(system)
+        self.assertEqual([t.wcrt for t in system.tasks],
+                         [3.71200471085605, 14.811427087898792, 59.076098324936666, 59.805718637674126,
+                          125.79281741824641, 34.724103065405075, 214.20559703039552, 340.36320551777993,
+                          439.73048437836917, 491.29067958567055, 28.00057007731079, 70.17450168135235,
+                          169.89984726533643, 177.8925872863692, 200.6906235763388, 0.28947881038893497,
+                          144.09436745885503, 311.19508692488273, 329.44138107037287, 380.06995241321147])
+
+    def test_local_limit(self):
+        # the response time kept when the limit is reached depends on the order in which the psi values are visited
+        system = _system((2, 3, 2), 0.85, seed=785, k=1, local=True)
+        HolisticLocalEDFAnalysis(limit_factor=2, reset=False).apply(system)
+        self.assertEqual([t.wcrt for t in system.tasks],
+                         [140.5545498310909, 296.2810766805691, 366.8763810792013, 223.79529365046105,
+                          508.3211194053847, 784.9121071029261])
+
+    def test_global(self):
+        system = _system((4, 5, 3), 0.6, seed=1260, k=2, local=False)
+        HolisticGlobalEDFAnalysis(limit_factor=10, reset=True).apply(system)
+        self.assertEqual([t.wcrt for t in system.tasks],
+                         [13.958131329977942, 165.0992042331668, 403.787953281123, 504.9150187481749,
+                          517.8881202100685, 164.58409899718382, 205.59159140680106, 239.18245522581364,
+                          269.0548047158856, 296.429452671322, 22.640155678993956, 32.36131981697428,
+                          85.30937800773134, 93.93744196631495, 213.5538819612005, 138.39493861429247,
+                          200.08433746354297, 298.9828519393843, 345.6743451017169, 368.02451738372264])
+
+    def test_global_limit(self):
+        system = _system((4, 5, 3), 0.75, seed=1275, k=0, local=False)
+        HolisticGlobalEDFAnalysis(limit_factor=2, reset=False).apply(system)
+        self.assertEqual([t.wcrt for t in system.tasks],
+                         [251.7773467976645, 393.35139307185216, 441.75236306491297, 723.2010930657846,
+                          739.669049277027, 311.6764620010322, 409.3807158530934, 503.70684803396983,
+                          515.4433184269249, 543.3310209136273, 438.5345814833186, 563.5586452268313,
+                          613.7763394765896, 620.2034055477179, 621.9702491157158, 295.3942968952156,
+                          502.31374440815, 568.381239075123, 576.862396118394, 609.3876127804554])
+
+
+def _system(size, utilization, seed, k, local):
+    """k-th unbalanced system generated with the seed, with EDF schedulers and PD deadlines"""
+    random = Random(seed)
+    systems = [get_system(size, random, utilization=utilization, balanced=False, name=str(i)) for i in range(k + 1)]
+    system = to_edf(systems[k], local=local)
+    PDAssignment().apply(system)
+    return system
+
+
+if __name__ == '__main__':
+    unittest.main()
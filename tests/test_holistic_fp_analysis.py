@@ -1,12 +1,15 @@
 import unittest
 from random import Random
 
-from analysis.holistic_fp_analysis import HolisticFPAnalysis
+import numpy as np
+
+from analysis.holistic_fp_analysis import HolisticFPAnalysis, holistic_fp_scenarios
 from assignment.hopa_assignment import HOPAssignment
 from assignment.assignments import PDAssignment
-from examples.example_models import get_palencia_system
+from examples.example_models import get_palencia_system, get_system
 from examples.generator import generate_system
 from model.linear_system import SchedulerType
+from vector.vector_fp import PrioritiesMatrix
 
 
 class HolisticTest(unittest.TestCase):
@@ -58,6 +61,36 @@ class HolisticTest(unittest.TestCase):
         print(system.slack)
         self.assertAlmostEqual(system.slack, 0.28803, delta=0.00001)  # should be from iteration 8 of 12
 
+    def test_batch(self):
+        def systems():
+            random = Random(5)
+            return [get_system((3, 4, 3), random, balanced=i % 2 == 0, utilization=0.5 + 0.02 * i) for i in range(20)]
+
+        for reset in (False, True):
+            analysis = HolisticFPAnalysis(limit_factor=1, reset=reset)
+            single, batch = systems(), systems()
+            for system in single + batch:
+                PDAssignment().apply(system)
+            for system in single:
+                analysis.apply(system)
+            analysis.apply_batch(batch)
+            for a, b in zip(single, batch):
+                self.assertEqual([t.wcrt for t in a.tasks], [t.wcrt for t in b.tasks])
+
+    def test_scenarios(self):
+        system = get_system((3, 4, 3), Random(3), balanced=True, utilization=0.8)
+        PDAssignment(normalize=True).apply(system)
+        priorities = Random(4)
+        scenarios = [[priorities.random() for _ in system.tasks] for _ in range(10)]
+        r = holistic_fp_scenarios(system, PrioritiesMatrix().apply(system, scenarios))
+
+        analysis = HolisticFPAnalysis()
+        for k, scenario in enumerate(scenarios):
+            for task, priority in zip(system.tasks, scenario):
+                task.priority = priority
+            analysis.apply(system)
+            np.testing.assert_array_equal(r[:, k], [t.wcrt for t in system.tasks])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,30 @@
+import unittest
+from random import Random
+
+from examples.generator import generate_system
+from gradient_descent.parameter_handlers import MappingPriorityExtractor, MappingDeadlineExtractor
+from model.linear_system import SchedulerType
+
+
+class MappingExtractorTest(unittest.TestCase):
+    def test_mapping_round_trip(self):
+        random = Random(3)
+        for n_procs in (1, 2, 4, 5):
+            for handler in (MappingPriorityExtractor(), MappingDeadlineExtractor()):
+                system = generate_system(random, n_flows=3, n_tasks=4, n_procs=n_procs, sched=SchedulerType.FP,
+                                         utilization=0.5, period_min=100, period_max=1000,
+                                         deadline_factor_min=0.5, deadline_factor_max=1)
+                for i, task in enumerate(system.tasks):
+                    task.deadline = i + 1
+                mapping = [system.processors.index(task.processor) for task in system.tasks]
+
+                x = handler.extract(system)
+                self.assertEqual(len(x), len(system.tasks) * (n_procs + 1))
+                for task in system.tasks:
+                    task.processor = system.processors[0]
+                handler.insert(system, x)
+                self.assertEqual([system.processors.index(task.processor) for task in system.tasks], mapping)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,12 @@
+"""
+Optional Numba support. When Numba is not available, the decorated kernels run as plain Python functions.
+"""
+try:
+    from numba import njit, prange
+except ImportError:
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+    prange = range
@@ -1,5 +1,6 @@
 import numpy as np
 
+from analysis.holistic_fp_analysis import holistic_fp_scenarios
 from model.analysis_function import init_wcrt
 from gradient_descent.gradient_function import AvgSeparationDelta, gradient_inputs_from_deltas, gradient_from_costs
 from gradient_descent.interfaces import GradientFunction
@@ -57,10 +58,19 @@ class PriorityScenarios:
 
 
 class VectorFPGradientFunction(GradientFunction):
-    def __init__(self, scenarios_builder: PriorityScenarios, sigma=1.5):
+    def __init__(self, scenarios_builder: PriorityScenarios = None, sigma=1.5, parallel=False):
+        """
+        Evaluates all the gradient inputs (2 per parameter) as scenarios of a single vectorized analysis.
+        scenarios_builder: builds the priority scenarios from the inputs. Defaults to PrioritiesMatrix
+        parallel: analyze each scenario with the compiled holistic analysis, in parallel (see holistic_fp_scenarios),
+        instead of with VectorHolisticFPAnalysis. The scalar analysis works in double precision, so the gradients
+        may differ slightly from the vectorized ones
+        """
+        self.parallel = parallel
         self.delta_function = AvgSeparationDelta(sigma=sigma)
-        self.scenarios_builder = scenarios_builder
+        self.scenarios_builder = scenarios_builder if scenarios_builder is not None else PrioritiesMatrix()
         self.cache = ResultsCache()
+        self._inputs = None  # buffer for the gradient inputs, reused across iterations
 
     def reset(self):
         self.cache.reset()
@@ -70,52 +80,66 @@ class VectorFPGradientFunction(GradientFunction):
         n = len(tasks)
         priority_matrices = self.scenarios_builder.apply(system, inputs)
         deadlines = np.array([task.flow.deadline for task in tasks]).reshape(n, 1)
+        if self.parallel:
+            r = self._scenarios_response_times(system, priority_matrices)
+            return np.max((r - deadlines) / deadlines, axis=0)
+
         vholistic = VectorHolisticFPAnalysis(limit_factor=10, verbose=False, cache=self.cache)
         vholistic.apply(system, scenarios=priority_matrices)
         r = vholistic.scenarios_response_times
         costs = np.max((r - deadlines) / deadlines, axis=0)
         return costs
 
+    def _scenarios_response_times(self, system: LinearSystem, priority_matrices: np.ndarray) -> np.ndarray:
+        """
+        Response times of the scenarios with holistic_fp_scenarios. Perturbing a single priority often leaves the
+        order of the tasks unchanged, so only the distinct scenarios that are not in the cache are analyzed
+        """
+        pm = prune_known_scenarios(priority_matrices, self.cache)
+        if pm.shape[0] > 0:
+            pm = np.unique(pm, axis=0)
+            r = holistic_fp_scenarios(system, pm, limit_factor=10)
+            for k in range(pm.shape[0]):
+                self.cache.insert(pm[k], r[:, k:k+1])
+        return build_results_from_cache(priority_matrices, self.cache)
+
     def compute(self, system: LinearSystem, x: [float]) -> [float]:
         deltas = self.delta_function.apply(system, x)
-        inputs = gradient_inputs_from_deltas(x, deltas)
+        self._inputs = inputs = gradient_inputs_from_deltas(x, deltas, out=self._inputs)
         costs = self._compute_costs(system, inputs)
         gradient = gradient_from_costs(costs, deltas)
         return gradient
 
 
-def proc(task_mapping):
-    proc_index = np.array(task_mapping).argmax() + 1
-    return proc_index
-
-
 class MappingPrioritiesMatrix(PriorityScenarios):
     def apply(self, S: LinearSystem, inputs: [[float]]) -> np.ndarray:
         p = len(S.processors)
         n = len(S.tasks)
-        pm = np.zeros((len(inputs), n, n))
+        inputs = np.asarray(inputs, dtype=np.float64).reshape(-1, p*n + n)
         # each input x of length p*n + n
-        #  first p*t is for mapping
+        #  first p*t is for mapping: each task goes to the processor with the highest value
         #  rest n for priorities
-        for i, x in enumerate(inputs):
-            mapping = np.array([proc(x[t*p:t*p+p]) for t in range(n)]).reshape(-1, 1)
-            priorities = np.array(x[-n:]).reshape(-1, 1)
-            temp = (priorities < priorities.T) * (mapping == mapping.T)
-            pm[i::] = temp
-        return pm
+        mapping = inputs[:, :p*n].reshape(-1, n, p).argmax(axis=2)
+        priorities = inputs[:, -n:]
+        return scenarios_matrix(priorities, mapping)
 
 
 class PrioritiesMatrix(PriorityScenarios):
     def apply(self, S: LinearSystem, inputs: [[float]]) -> np.ndarray:
         n = len(S.tasks)
-        pm = np.zeros((len(inputs), n, n))
         procs = S.processors
-        mapping = np.array([procs.index(task.processor)+1 for task in S.tasks]).reshape(-1, 1)
-        for i, x in enumerate(inputs):
-            priorities = np.array(x[-n:]).reshape(-1, 1)
-            temp = (priorities < priorities.T) * (mapping == mapping.T)
-            pm[i::] = temp
-        return pm
+        mapping = np.array([procs.index(task.processor) for task in S.tasks]).reshape(1, n)
+        priorities = np.atleast_2d(np.asarray(inputs, dtype=np.float64))[:, -n:]
+        return scenarios_matrix(priorities, mapping)
+
+
+def scenarios_matrix(priorities: np.ndarray, mapping: np.ndarray) -> np.ndarray:
+    """
+    Builds the 3D priority matrix (s, n, n) from the (s, n) priorities and processor indexes of each scenario. The
+    mapping can also be a single (1, n) row shared by every scenario
+    """
+    pm = (priorities[:, :, None] < priorities[:, None, :]) & (mapping[:, :, None] == mapping[:, None, :])
+    return pm.astype(np.float64)
 
 
 class VectorHolisticFPAnalysis:
@@ -1,6 +1,6 @@
 import numpy as np
 
-from analysis.holistic_fp_analysis import HolisticFPAnalysis
+from analysis.holistic_fp_analysis import HolisticFPAnalysis, MemoizedHolisticFPAnalysis
 from random import Random
 from functools import partial
 
@@ -17,20 +17,27 @@ from model.linear_system import LinearSystem
 from vector.vector_fp import VectorFPGradientFunction
 
 
-def gdpa_pd_fp_vector(system: LinearSystem) -> bool:
-    analysis = HolisticFPAnalysis(limit_factor=10, reset=False)
+def gdpa_fp_vector_optimizer() -> GradientDescentOptimizer:
+    analysis = MemoizedHolisticFPAnalysis(limit_factor=10, reset=False)
     parameter_handler = PriorityExtractor()
     cost_function = InvslackCost(parameter_handler=parameter_handler, analysis=analysis)
     stop_function = ThresholdStopFunction(limit=100)
     gradient_function = VectorFPGradientFunction()
 
     update_function = NoisyAdam()
-    optimizer = GradientDescentOptimizer(parameter_handler=parameter_handler,
-                                        cost_function=cost_function,
-                                        stop_function=stop_function,
-                                        gradient_function=gradient_function,
-                                        update_function=update_function,
-                                        verbose=False)
+    return GradientDescentOptimizer(parameter_handler=parameter_handler,
+                                    cost_function=cost_function,
+                                    stop_function=stop_function,
+                                    gradient_function=gradient_function,
+                                    update_function=update_function,
+                                    verbose=False)
+
+
+def gdpa_pd_fp_vector(system: LinearSystem, optimizer: GradientDescentOptimizer = None) -> bool:
+    if optimizer is None:
+        optimizer = gdpa_fp_vector_optimizer()
+    else:
+        optimizer.reset()  # reused across systems, forget the state of the previous one
 
     pd = PDAssignment(normalize=True)
     pd.apply(system)
@@ -83,8 +90,9 @@ if __name__ == '__main__':
     # utilizations between 50 % and 90 %
     utilizations = np.linspace(0.5, 0.9, 20)
 
+    # optimizers are built once and reset before each system, every worker process gets its own copy
     tools = [
-        ("gdpa", gdpa_pd_fp_vector),
+        ("gdpa", partial(gdpa_pd_fp_vector, optimizer=gdpa_fp_vector_optimizer())),
         ("hopa", hopa_fp),
         ("pd", pd_fp),
         ("eqs", eqs_fp),